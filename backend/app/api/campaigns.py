@@ -0,0 +1,47 @@
+import os
+import tempfile
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from db.config_db import get_user_campaigns
+from scripts.campaigns import write_contact_list
+
+router = APIRouter()
+
+@router.get("/campaigns")
+def list_campaigns(email: str):
+    """List the user's campaigns so an interrupted one can be resumed."""
+    if not email:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Email is required",
+                "code": "MISSING_EMAIL",
+                "action": "Please make sure you are logged in"
+            }
+        )
+    return get_user_campaigns(email)
+
+@router.get("/contact-list/export")
+def export_contact_list(email: str):
+    """Download the contacts of all the user's campaigns, merged by email and grouped by company."""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_contact_list(email, path)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "message": str(e),
+                "code": "EXPORT_ERROR",
+                "action": "Please try again or contact support"
+            }
+        )
+    return FileResponse(
+        path,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename="contact_list.xlsx",
+        background=BackgroundTask(os.remove, path)
+    )
@@ -1,5 +1,10 @@
 from fastapi import APIRouter, Request, HTTPException
-from db.config_db import save_user_config, get_user_config
+from fastapi.concurrency import run_in_threadpool
+from db.config_db import (
+    save_user_config, get_user_config,
+    get_smtp_accounts, save_smtp_account, delete_smtp_account
+)
+from scripts.send_emails import check_openai_key
 
 router = APIRouter()
 
@@ -18,8 +23,49 @@ async def post_config(request: Request):
             }
         )
     save_user_config(email, config)
+
+    # Validate a new OpenAI key once here so campaigns can skip the check
+    if config.get("openai_api_key"):
+        saved_config = get_user_config(email)
+        valid, error = await run_in_threadpool(check_openai_key, email, saved_config)
+        return {"status": "ok", "openai_key_valid": valid, "openai_key_error": error}
     return {"status": "ok"}
 
 @router.get("/config")
 async def fetch_config(email: str):
-    return get_user_config(email) 
\ No newline at end of file
+    return get_user_config(email) 
+
+@router.get("/smtp-accounts")
+async def fetch_smtp_accounts(email: str):
+    return get_smtp_accounts(email)
+
+@router.post("/smtp-accounts")
+async def post_smtp_account(request: Request):
+    data = await request.json()
+    email = data.get("email")
+    account = data.get("account")
+    if not email or not account:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Missing email or account",
+                "code": "MISSING_PARAMS",
+                "action": "Please provide both email and account"
+            }
+        )
+    saved = save_smtp_account(email, account)
+    if saved:
+        return saved
+    raise HTTPException(
+        status_code=404,
+        detail={
+            "message": "SMTP account not found or could not be saved",
+            "code": "SMTP_ACCOUNT_NOT_FOUND",
+            "action": "Please check the account and try again"
+        }
+    )
+
+@router.delete("/smtp-accounts/{account_id}")
+async def remove_smtp_account(email: str, account_id: int):
+    success = delete_smtp_account(email, account_id)
+    return {"success": success}
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Request, HTTPException
+from db.config_db import delete_company_enrichment
+from scripts.enrichment import company_key
+
+router = APIRouter()
+
+@router.post("/enrichment-cache/refresh")
+async def refresh_enrichment_cache(request: Request):
+    """
+    Forget a company's cached details so the next campaign asks GPT again.
+    The cache is shared by every user, so only one company at a time can be
+    refreshed; use refresh_enrichment on /send-emails to bypass it for a run.
+    """
+    data = await request.json()
+    email = data.get("email")
+    company = company_key(data.get("company"))
+    if not email:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Email is required",
+                "code": "MISSING_EMAIL",
+                "action": "Please make sure you are logged in"
+            }
+        )
+    if not company:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Company is required",
+                "code": "MISSING_COMPANY",
+                "action": "Please provide the company whose details should be refreshed"
+            }
+        )
+    deleted = delete_company_enrichment(company)
+    return {"status": "ok", "deleted": deleted}
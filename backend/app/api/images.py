@@ -1,10 +1,13 @@
 import os
+import ssl
 import logging
-import requests
-import certifi
+import httpx
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from db.config_db import get_db, UserConfig
+from scripts.upload_dedup import UploadFingerprint
+from ..core.http import get_http_client
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -22,8 +25,10 @@ async def process_image(
     if not file.filename.lower().endswith('.png'):
         raise HTTPException(status_code=400, detail="Only PNG files are supported")
 
-    # Get user's API configuration
-    config = db.query(UserConfig).filter(UserConfig.email == email).first()
+    # Get user's API configuration (off the event loop, the ORM is blocking)
+    config = await run_in_threadpool(
+        lambda: db.query(UserConfig).filter(UserConfig.email == email).first()
+    )
     if not config or not config.api_key or not config.api_endpoint:
         raise HTTPException(
             status_code=400,
@@ -38,10 +43,17 @@ async def process_image(
         # Read file content
         contents = await file.read()
         logger.info(f"Processing image for user {email}, file size: {len(contents)} bytes")
-        
-        # Create a session with proper SSL configuration
-        session = requests.Session()
-        session.verify = certifi.where()  # Use certifi's certificate bundle
+
+        # A screenshot the user already sent is answered without calling the API
+        fingerprint = await run_in_threadpool(UploadFingerprint, email, contents, file.filename)
+        duplicate = await run_in_threadpool(fingerprint.find_duplicate)
+        if duplicate is not None:
+            logger.info(f"Skipping {file.filename} for user {email}, same screenshot as {duplicate['file_name']}")
+            return {
+                "message": "Image already processed",
+                "duplicate": True,
+                "duplicate_of": duplicate["file_name"]
+            }
         
         # Decrypt the API endpoint
         from db.config_db import encryption
@@ -73,14 +85,13 @@ async def process_image(
             'file': (file.filename, contents, 'image/png')
         }
         
-        # Process with processing API
-        response = session.post(
+        # Process with processing API over the shared keep-alive client
+        response = await get_http_client().post(
             api_url,
             headers={
                 "Authorization": f"Bearer {config.api_key}"
             },
-            files=files,
-            timeout=30  # Add timeout
+            files=files
         )
         
         logger.info(f"API Response status code: {response.status_code}")
@@ -92,22 +103,23 @@ async def process_image(
                 status_code=response.status_code,
                 detail=error_detail
             )
-            
+
+        await run_in_threadpool(fingerprint.remember)
         return {"message": "Image processed successfully"}
         
-    except requests.exceptions.SSLError as e:
-        error_msg = f"SSL Error: {str(e)}"
-        logger.error(error_msg)
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "message": "SSL certificate verification failed",
-                "code": "SSL_ERROR",
-                "error": str(e),
-                "action": "Please ensure your system's SSL certificates are up to date"
-            }
-        )
-    except requests.exceptions.ConnectionError as e:
+    except httpx.NetworkError as e:
+        if isinstance(e.__context__, ssl.SSLError):
+            error_msg = f"SSL Error: {str(e)}"
+            logger.error(error_msg)
+            raise HTTPException(
+                status_code=500,
+                detail={
+                    "message": "SSL certificate verification failed",
+                    "code": "SSL_ERROR",
+                    "error": str(e),
+                    "action": "Please ensure your system's SSL certificates are up to date"
+                }
+            )
         error_msg = f"Connection Error: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(
@@ -119,7 +131,7 @@ async def process_image(
                 "action": "Please check your internet connection and try again"
             }
         )
-    except requests.exceptions.Timeout as e:
+    except httpx.TimeoutException as e:
         error_msg = f"Timeout Error: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(
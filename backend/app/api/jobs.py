@@ -0,0 +1,68 @@
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from ..core.jobs import job_queue
+
+router = APIRouter()
+
+JOB_EVENT_POLL_INTERVAL = 0.25  # Seconds between checks for new events while streaming
+
+def get_job_or_404(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": "Job not found",
+                "code": "JOB_NOT_FOUND",
+                "action": "The job may have finished too long ago, check your campaigns instead"
+            }
+        )
+    return job
+
+@router.get("/jobs")
+def list_jobs(email: str):
+    """List the user's background jobs, newest first."""
+    jobs = [job.summary() for job in job_queue.snapshot(email)]
+    return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+@router.get("/jobs/stats")
+def get_job_stats():
+    """Scheduler load: queued and running jobs, and queue waits per user."""
+    return job_queue.stats()
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = get_job_or_404(job_id)
+    return {**job.summary(), "queue_position": job_queue.queue_position(job)}
+
+@router.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str, after: int = -1, stream: bool = True):
+    """
+    Events of a job numbered above `after`. By default they are streamed as
+    JSON lines until the job finishes; reconnect with the last `seq` seen to
+    resume. With `stream=false` the events available now are returned at once.
+    """
+    job = get_job_or_404(job_id)
+    if not stream:
+        return {**job.summary(), "events": job.events_after(after)}
+
+    async def follow():
+        last_seq = after
+        while True:
+            finished = job.finished
+            for event in job.events_after(last_seq):
+                last_seq = event["seq"]
+                yield json.dumps(event) + "\n"
+            if finished:
+                return
+            await asyncio.sleep(JOB_EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(follow(), media_type="text/event-stream")
+
+@router.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Stop a queued or running job. A cancelled campaign can be resumed later."""
+    get_job_or_404(job_id)
+    return {"cancelled": job_queue.cancel(job_id)}
@@ -1,9 +1,10 @@
 import os
-import pandas as pd
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse, FileResponse
 from scripts.download_contacts import download_and_clean_sheet, get_sheet_preview, DOWNLOADS_PATH
 from scripts.send_emails import run_from_ui
+from db.config_db import get_user_config, get_campaign, RESUMABLE_CAMPAIGN_STATUSES
+from ..core.jobs import job_queue
 
 router = APIRouter()
 
@@ -62,20 +63,8 @@ async def download_contacts(request: Request):
 def sheet_preview(url: str, rows: int = 5):
     """Return the first `rows` rows of the Google Sheet as JSON."""
     try:
-        preview_data = get_sheet_preview(url, rows)
-        # Convert NaN values to None for JSON serialization
-        cleaned_data = []
-        for row in preview_data:
-            cleaned_row = {}
-            for k, v in row.items():
-                if pd.isna(v):
-                    cleaned_row[k] = None
-                elif isinstance(v, str):
-                    cleaned_row[k] = v
-                else:
-                    cleaned_row[k] = v
-            cleaned_data.append(cleaned_row)
-        return cleaned_data
+        # Only the first rows are downloaded, with NaN already converted to None
+        return get_sheet_preview(url, rows)
 
     except Exception as e:
         raise HTTPException(
@@ -95,8 +84,10 @@ async def send_emails(request: Request):
         sheet_url = data.get("sheet_url")
         confirmed = data.get("confirmed", False)
         use_cc = data.get("use_cc", False)
+        refresh_enrichment = data.get("refresh_enrichment", False)
+        campaign_id = data.get("campaign_id")  # Resume an interrupted campaign
         
-        if not email or not sheet_url:
+        if not email or not (sheet_url or campaign_id):
             raise HTTPException(
                 status_code=400,
                 detail={
@@ -109,15 +100,41 @@ async def send_emails(request: Request):
         if not confirmed:
             # Return preview data
             return StreamingResponse(
-                run_from_ui(sheet_url, preview_only=True, email=email),
+                run_from_ui(sheet_url, preview_only=True, email=email, campaign_id=campaign_id),
                 media_type="text/event-stream"
             )
         
-        # Send emails
-        return StreamingResponse(
-            run_from_ui(sheet_url, email=email, use_cc=use_cc),
-            media_type="text/event-stream"
-        )
+        if campaign_id:
+            campaign = get_campaign(campaign_id)
+            if not campaign or campaign["owner"] != email:
+                raise HTTPException(
+                    status_code=404,
+                    detail={
+                        "message": f"Campaign {campaign_id} not found",
+                        "code": "CAMPAIGN_NOT_FOUND",
+                        "action": "Please pick a campaign from your campaign list"
+                    }
+                )
+            if campaign["status"] not in RESUMABLE_CAMPAIGN_STATUSES:
+                raise HTTPException(
+                    status_code=409,
+                    detail={
+                        "message": f"Campaign {campaign_id} is {campaign['status']} and can't be resumed",
+                        "code": "CAMPAIGN_NOT_RESUMABLE",
+                        "action": "Wait for the running campaign to finish or stop it first"
+                    }
+                )
+
+        # Send emails in the background; progress is read from /jobs/{job_id}/events
+        # Weight and concurrency cap set for the user decide their share of workers
+        config = get_user_config(email) or {}
+        job = job_queue.submit(email, lambda: run_from_ui(
+            sheet_url, email=email, use_cc=use_cc,
+            refresh_enrichment=refresh_enrichment, campaign_id=campaign_id
+        ), weight=config.get("campaign_weight"), max_active=config.get("campaign_max_concurrent"))
+        return {"job_id": job.id, "status": job.status}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -3,6 +3,7 @@ from db.config_db import (
     get_user_templates, save_template, delete_template,
     update_template, init_default_template
 )
+from scripts.template_engine import template_cache
 
 router = APIRouter()
 
@@ -60,6 +61,8 @@ async def upload_template(
 @router.delete("/templates/{template_name}")
 async def remove_template(email: str, template_name: str):
     success = delete_template(email, template_name)
+    if success:
+        template_cache.invalidate(email)
     return {"success": success}
 
 @router.put("/templates/{template_name}")
@@ -78,6 +81,8 @@ async def update_template_endpoint(template_name: str, request: Request):
         )
     result = update_template(email, template_name, updated_template)
     if result:
+        # Campaigns must not reuse the previously compiled version
+        template_cache.invalidate(email)
         return result
     raise HTTPException(
         status_code=404,
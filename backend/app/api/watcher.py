@@ -1,22 +1,14 @@
 import os
-import multiprocessing
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from db.config_db import get_user_config
-from ..core.subprocesses import run_script_background
-from ..core.settings import WATCH_SCRIPT
+from ..core.watchers import watcher_manager
 
 router = APIRouter()
 
-active_watcher = None
-
 @router.post("/watcher/start")
 async def start_watcher(request: Request):
-    """Start watching the selected folder."""
-    global active_watcher
-
-    if active_watcher and active_watcher.is_alive():
-        return {"status": "already running"}
-
+    """Start watching the selected folder for the user."""
     data = await request.json()
     watch_folder = data.get("watchFolder")
     email = data.get("email")
@@ -43,16 +35,7 @@ async def start_watcher(request: Request):
 
     # Verify user configuration before starting
     try:
-        config = get_user_config(email)
-        if not config.get("api_key") or not config.get("api_endpoint"):
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "message": "Processing API configuration is missing",
-                    "code": "MISSING_API_CONFIG",
-                    "action": "Please configure your processing API settings first"
-                }
-            )
+        config = get_user_config(email) or {}
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -62,17 +45,30 @@ async def start_watcher(request: Request):
                 "action": "Please try again or contact support"
             }
         )
+    if not config.get("api_key") or not config.get("api_endpoint"):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Processing API configuration is missing",
+                "code": "MISSING_API_CONFIG",
+                "action": "Please configure your processing API settings first"
+            }
+        )
 
     print(f"Starting watcher for folder: {watch_folder}")
 
     try:
-        active_watcher = multiprocessing.Process(
-            target=run_script_background,
-            args=(WATCH_SCRIPT, watch_folder, email),
-            name="watcher"
+        # Runs in a thread: starting a watch scans the folder for files to catch up on
+        folder_watch, started = await run_in_threadpool(watcher_manager.start, email, watch_folder)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": str(e),
+                "code": "INVALID_FOLDER",
+                "action": "Please select an existing folder to watch"
+            }
         )
-        active_watcher.start()
-        return {"status": "ok", "message": "Watcher started successfully"}
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -82,19 +78,28 @@ async def start_watcher(request: Request):
                 "action": "Please try again or contact support"
             }
         )
+    if not started:
+        return {"status": "already running", "watch": folder_watch.status()}
+    return {"status": "ok", "message": "Watcher started successfully", "watch": folder_watch.status()}
 
 @router.post("/watcher/stop")
-async def stop_watcher():
-    """Stop the folder watcher."""
-    global active_watcher
+async def stop_watcher(request: Request):
+    """Stop the user's watch on a folder, or all of the user's watches when no folder is given."""
+    data = await request.json()
+    email = data.get("email")
+    if not email:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Email is required",
+                "code": "MISSING_EMAIL",
+                "action": "Please make sure you are logged in"
+            }
+        )
     try:
-        if active_watcher and active_watcher.is_alive():
-            active_watcher.terminate()
-            active_watcher.join(timeout=5)
-            if active_watcher.is_alive():
-                active_watcher.kill()
-            active_watcher = None
-            return {"status": "ok", "message": "Watcher stopped successfully"}
+        stopped = watcher_manager.stop(email, data.get("watchFolder"))
+        if stopped:
+            return {"status": "ok", "message": "Watcher stopped successfully", "folders": [w.folder for w in stopped]}
         return {"status": "not running", "message": "No active watcher found"}
     except Exception as e:
         raise HTTPException(
@@ -107,12 +112,13 @@ async def stop_watcher():
         )
 
 @router.get("/watcher/status")
-async def get_watcher_status():
-    """Get the current status of the watcher."""
-    global active_watcher
+async def get_watcher_status(email: str = None):
+    """Get the status of the user's watches (of every watch without an email)."""
+    watches = watcher_manager.status(email)
     return {
-        "is_running": active_watcher is not None and active_watcher.is_alive(),
-        "processed_files": get_processed_files() if active_watcher and active_watcher.is_alive() else []
+        "is_running": bool(watches),
+        "watches": watches,
+        "processed_files": get_processed_files() if watches else []
     }
 
 def get_processed_files():
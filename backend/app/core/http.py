@@ -0,0 +1,37 @@
+import certifi
+import httpx
+from typing import Optional
+
+# Shared client for upstream APIs, created once at startup so requests reuse
+# pooled keep-alive connections instead of opening a session per call
+UPSTREAM_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+UPSTREAM_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        verify=certifi.where(),  # Use certifi's certificate bundle
+        timeout=UPSTREAM_TIMEOUT,
+        limits=UPSTREAM_LIMITS
+    )
+
+async def start_http_client():
+    """Create the shared async HTTP client."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+async def close_http_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if the startup hook hasn't run."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Campaign jobs run on this many worker threads, independent of HTTP requests
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_TIME_SLICE = float(os.getenv("JOB_TIME_SLICE", 2))  # Seconds a job runs before others get a turn
+# Started jobs across all users. At most JOB_MAX_ACTIVE - JOB_WORKERS of them
+# are suspended between slices at a time, each keeping one SMTP session per
+# account and its idle thread pools open; a session the provider dropped
+# meanwhile is reopened before the next send
+JOB_MAX_ACTIVE = int(os.getenv("JOB_MAX_ACTIVE", 2 * JOB_WORKERS))
+JOB_MIN_SLICE_COST = 1.0  # Charged for a slice that handled no email, so it isn't free
+JOB_TENANT_MAX_ACTIVE = int(os.getenv("JOB_TENANT_MAX_ACTIVE", 2))  # Started jobs per user by default
+JOB_DEFAULT_WEIGHT = 1.0
+JOB_WAIT_SAMPLES = 50
+JOB_MAX_EVENTS = 10000  # Events kept per job for late subscribers
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 3600))  # Seconds a finished job stays queryable
+
+# "paused" and "incomplete" campaigns stopped before the end of the sheet and can be resumed
+FINISHED_STATUSES = {"completed", "paused", "incomplete", "failed", "cancelled"}
+
+class Job:
+    """
+    One background campaign run. Events from its generator are numbered
+    and kept so clients can subscribe, re-subscribe from where they left
+    off, or poll.
+    """
+
+    def __init__(self, owner: str, run: Callable[[], Iterator[str]]):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.run = run
+        self.status = "queued"
+        self.campaign_id = None
+        self.error = None  # Last error event
+        self.campaign_status = None  # How the campaign ended, from its last event
+        self.succeeded = False
+        self.sent = 0
+        self.handled = 0  # Emails sent or failed, what a slice is charged for
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = threading.Event()
+        self.events = None  # The running generator, kept between time slices
+        self._events = deque(maxlen=JOB_MAX_EVENTS)
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def add_event(self, event: dict):
+        with self._lock:
+            event = {**event, "seq": self._next_seq}
+            self._next_seq += 1
+            self._events.append(event)
+        if "campaign_status" in event:
+            self.campaign_status = event["campaign_status"]
+            self.succeeded = self.campaign_status == "completed"
+        if event.get("type") == "campaign":
+            self.campaign_id = event.get("campaign_id")
+        elif event.get("type") == "error":
+            self.error = event.get("message")
+        elif str(event.get("message", "")).startswith("✓ Email sent to"):
+            self.sent += 1
+            self.handled += 1
+        elif str(event.get("message", "")).startswith("Failed to send"):
+            self.handled += 1
+
+    def events_after(self, seq: int) -> List[dict]:
+        """Events numbered above `seq` that are still retained."""
+        with self._lock:
+            return [event for event in self._events if event["seq"] > seq]
+
+    def summary(self) -> dict:
+        with self._lock:
+            last_seq = self._next_seq - 1
+        return {
+            "job_id": self.id,
+            "owner": self.owner,
+            "status": self.status,
+            "campaign_id": self.campaign_id,
+            "campaign_status": self.campaign_status,
+            "sent": self.sent,
+            "error": self.error,
+            "last_seq": last_seq,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "wait_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "finished_at": self.finished_at
+        }
+
+class Tenant:
+    """Scheduling state of one user's jobs."""
+
+    def __init__(self, owner: str):
+        self.owner = owner
+        self.weight = JOB_DEFAULT_WEIGHT
+        self.max_active = JOB_TENANT_MAX_ACTIVE
+        self.queued = deque()  # Jobs not started yet
+        self.runnable = deque()  # Started jobs waiting for their next slice
+        self.active = 0  # Started, unfinished jobs
+        self.vtime = 0.0  # Emails handled, divided by weight
+        self.waits = deque(maxlen=JOB_WAIT_SAMPLES)  # Recent queue waits in seconds
+
+    @property
+    def idle(self) -> bool:
+        return not self.queued and not self.active
+
+    def stats(self) -> dict:
+        return {
+            "owner": self.owner,
+            "weight": self.weight,
+            "max_active": self.max_active,
+            "queued": len(self.queued),
+            "active": self.active,
+            "virtual_time": round(self.vtime, 3),
+            "avg_wait_seconds": round(sum(self.waits) / len(self.waits), 3) if self.waits else 0.0
+        }
+
+class JobQueue:
+    """
+    Fair scheduler for campaign jobs across users. Workers run jobs in time
+    slices of JOB_TIME_SLICE seconds and always serve the user who had the
+    fewest emails handled, divided by their weight, so a small campaign
+    gets turns while large ones are running. Slices are charged by emails
+    rather than wall time, since most of a slice is spent waiting on SMTP
+    pacing. A job is only a generator to the scheduler: between
+    its slices it stays suspended at a yield, and a campaign pauses its own
+    sender and enrichment threads while suspended there. Each user has at
+    most `max_active` started jobs and at most JOB_MAX_ACTIVE jobs are
+    started overall; the rest wait queued.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, time_slice: float = JOB_TIME_SLICE,
+                 max_active: int = JOB_MAX_ACTIVE):
+        self.workers = workers
+        self.time_slice = time_slice
+        self.max_active = max_active
+        self.jobs: Dict[str, Job] = {}
+        self.tenants: Dict[str, Tenant] = {}
+        self.active = 0
+        self.busy_workers = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Cancel every job and let the workers exit."""
+        with self._cond:
+            for job in self.jobs.values():
+                job.cancelled.set()
+            self._stopping = True
+            self._threads = []
+            self._cond.notify_all()
+
+    def submit(self, owner: str, run: Callable[[], Iterator[str]],
+               weight: Optional[float] = None, max_active: Optional[int] = None) -> Job:
+        self.start()
+        job = Job(owner, run)
+        with self._cond:
+            self._prune()
+            tenant = self.tenants.get(owner)
+            if tenant is None:
+                tenant = self.tenants[owner] = Tenant(owner)
+            if tenant.idle:
+                # Don't let a user bank credit while they had nothing to run
+                tenant.vtime = max(tenant.vtime, self._min_vtime())
+            tenant.weight = max(weight or JOB_DEFAULT_WEIGHT, 0.01)
+            tenant.max_active = max(max_active or JOB_TENANT_MAX_ACTIVE, 1)
+            tenant.queued.append(job)
+            self.jobs[job.id] = job
+            self._cond.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def snapshot(self, owner: Optional[str] = None) -> List[Job]:
+        """The jobs currently kept, for one user or everyone."""
+        with self._cond:
+            return [job for job in self.jobs.values() if owner is None or job.owner == owner]
+
+    def cancel(self, job_id: str) -> bool:
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancelled.set()
+            tenant = self.tenants.get(job.owner)
+            if tenant is not None and job in tenant.queued:
+                tenant.queued.remove(job)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+            return True
+
+    def queue_position(self, job: Job) -> Optional[int]:
+        """Position of a queued job among its owner's queued jobs."""
+        with self._cond:
+            tenant = self.tenants.get(job.owner)
+            if tenant is None or job not in tenant.queued:
+                return None
+            return tenant.queued.index(job)
+
+    def stats(self) -> dict:
+        with self._cond:
+            tenants = [tenant.stats() for tenant in self.tenants.values() if not tenant.idle or tenant.waits]
+            return {
+                "workers": self.workers,
+                "busy_workers": self.busy_workers,
+                "active_jobs": self.active,
+                "max_active_jobs": self.max_active,
+                "queued_jobs": sum(tenant["queued"] for tenant in tenants),
+                "waiting_slices": sum(len(tenant.runnable) for tenant in self.tenants.values()),
+                "tenants": tenants
+            }
+
+    def _min_vtime(self) -> float:
+        busy = [tenant.vtime for tenant in self.tenants.values() if not tenant.idle]
+        return min(busy) if busy else 0.0
+
+    def _can_start(self, tenant: Tenant) -> bool:
+        return bool(tenant.queued) and tenant.active < tenant.max_active and self.active < self.max_active
+
+    def _next(self) -> Optional[Job]:
+        """Pick the next job to give a slice to. Called with the lock held."""
+        candidates = [
+            tenant for tenant in self.tenants.values()
+            if tenant.runnable or self._can_start(tenant)
+        ]
+        if not candidates:
+            return None
+        tenant = min(candidates, key=lambda tenant: (tenant.vtime, tenant.active))
+        if tenant.runnable:
+            return tenant.runnable.popleft()
+
+        job = tenant.queued.popleft()
+        tenant.active += 1
+        self.active += 1
+        job.started_at = time.time()
+        tenant.waits.append(job.started_at - job.created_at)
+        return job
+
+    def _has_other_work(self) -> bool:
+        with self._cond:
+            return any(tenant.runnable or self._can_start(tenant) for tenant in self.tenants.values())
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    job = self._next()
+                    if job is not None:
+                        break
+                    self._cond.wait()
+                if job is None:
+                    return
+                self.busy_workers += 1
+
+            handled = job.handled
+            finished = self._run_slice(job)
+            cost = max(job.handled - handled, JOB_MIN_SLICE_COST)
+
+            with self._cond:
+                self.busy_workers -= 1
+                tenant = self.tenants[job.owner]
+                tenant.vtime += cost / tenant.weight
+                if finished:
+                    tenant.active -= 1
+                    self.active -= 1
+                else:
+                    tenant.runnable.append(job)
+                self._cond.notify()
+
+    def _run_slice(self, job: Job) -> bool:
+        """Run a job until it finishes or its slice is over. Returns whether it finished."""
+        if job.events is None:
+            if job.cancelled.is_set():
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                return True
+            job.status = "running"
+            job.events = job.run()
+
+        deadline = time.monotonic() + self.time_slice
+        status = "failed"
+        try:
+            for line in job.events:
+                if line:
+                    try:
+                        job.add_event(json.loads(line))
+                    except ValueError:
+                        job.add_event({"type": "status", "message": line})
+                if job.cancelled.is_set():
+                    break
+                if time.monotonic() >= deadline and self._has_other_work():
+                    # Keep the generator suspended (which pauses the campaign) and let another job run
+                    return False
+            if job.cancelled.is_set():
+                status = "cancelled"
+            elif job.campaign_status in ("paused", "incomplete"):
+                status = job.campaign_status
+            elif job.succeeded or not job.error:
+                status = "completed"
+        except Exception as e:
+            logger.error(f"Job {job.id} crashed: {str(e)}")
+            job.add_event({"type": "error", "message": str(e)})
+        # Closing the generator runs its cleanup (SMTP sessions, checkpoints)
+        job.events.close()
+        job.finished_at = time.time()
+        job.status = status
+        return True
+
+    def _prune(self):
+        """Forget finished jobs older than JOB_RETENTION. Called with the lock held."""
+        cutoff = time.time() - JOB_RETENTION
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                self.jobs.pop(job_id, None)
+        for owner, tenant in list(self.tenants.items()):
+            if tenant.idle and not any(job.owner == owner for job in self.jobs.values()):
+                self.tenants.pop(owner, None)
+
+job_queue = JobQueue()
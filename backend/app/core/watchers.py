@@ -0,0 +1,122 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from watchdog.observers import Observer
+from scripts.watch_folder import ImageHandler, StabilityMonitor, get_api_config, report_upload
+from scripts.upload_queue import UploadQueue
+
+logger = logging.getLogger(__name__)
+
+class FolderWatch:
+    """One user's watch on one folder."""
+
+    def __init__(self, owner: str, folder: str, handler: ImageHandler):
+        self.owner = owner
+        self.folder = folder
+        self.handler = handler
+        self.watch = None  # Set once scheduled on the observer
+        self.started_at = time.time()
+        self.caught_up = 0  # Files found at startup that were added while not watched
+
+    def status(self) -> dict:
+        upload_queue = self.handler.upload_queue
+        return {
+            "email": self.owner,
+            "folder": self.folder,
+            "started_at": self.started_at,
+            "caught_up": self.caught_up,
+            "uploads": upload_queue.stats(self.owner, self.folder),
+            "last_error": upload_queue.last_error(self.owner, self.folder)
+        }
+
+class WatcherManager:
+    """
+    Runs every folder watch of the server in this process: one watchdog
+    observer thread receives the events of all folders, and new files go to
+    a shared, persistent upload queue once fully written, so a slow upload
+    doesn't hold up other folders. Watches are keyed by (user, folder).
+    """
+
+    def __init__(self):
+        self.watches: Dict[Tuple[str, str], FolderWatch] = {}
+        self.upload_queue = None
+        self._observer = None
+        self._monitor = None
+        self._lock = threading.Lock()
+
+    def start_uploads(self):
+        """Start the upload workers, which also send what was left queued before a restart."""
+        with self._lock:
+            if self.upload_queue is None:
+                self.upload_queue = UploadQueue(get_api_config, on_finish=report_upload)
+            self.upload_queue.start()
+
+    def start(self, owner: str, folder: str) -> Tuple[FolderWatch, bool]:
+        """
+        Start watching `folder` for `owner`. Returns the watch and whether it
+        was started now (False if it was already running). Raises ValueError
+        when the folder or the user's processing API settings are missing.
+        """
+        folder = os.path.realpath(folder)
+        if not os.path.isdir(folder):
+            raise ValueError(f"Folder not found: {folder}")
+
+        self.start_uploads()
+        with self._lock:
+            existing = self.watches.get((owner, folder))
+            if existing is not None:
+                return existing, False
+
+            if self._observer is None:
+                self._observer = Observer()
+                self._observer.start()
+                self._monitor = StabilityMonitor()
+
+            folder_watch = FolderWatch(owner, folder, ImageHandler(folder, owner, self.upload_queue, self._monitor))
+            folder_watch.watch = self._observer.schedule(folder_watch.handler, folder, recursive=False)
+            self.watches[(owner, folder)] = folder_watch
+
+        # Scheduled first so nothing added during the scan is missed
+        folder_watch.caught_up = folder_watch.handler.catch_up()
+        logger.info(f"Watching {folder} for {owner} ({len(self.watches)} watches, {folder_watch.caught_up} to catch up)")
+        return folder_watch, True
+
+    def stop(self, owner: str, folder: Optional[str] = None) -> List[FolderWatch]:
+        """Stop the user's watch on `folder`, or all of the user's watches. Returns those stopped."""
+        if folder is not None:
+            folder = os.path.realpath(folder)
+        with self._lock:
+            stopped = [
+                folder_watch for key, folder_watch in self.watches.items()
+                if key[0] == owner and (folder is None or key[1] == folder)
+            ]
+            for folder_watch in stopped:
+                self._observer.unschedule(folder_watch.watch)
+                self._monitor.discard(folder_watch.handler.enqueue)
+                del self.watches[(folder_watch.owner, folder_watch.folder)]
+                logger.info(f"Stopped watching {folder_watch.folder} for {owner}")
+            return stopped
+
+    def status(self, owner: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            return [
+                folder_watch.status() for folder_watch in self.watches.values()
+                if owner is None or folder_watch.owner == owner
+            ]
+
+    def shutdown(self):
+        """Stop every watch and the upload workers. Queued uploads are kept for the next start."""
+        with self._lock:
+            observer, monitor, upload_queue = self._observer, self._monitor, self.upload_queue
+            self._observer = self._monitor = None
+            self.watches.clear()
+        if observer is not None:
+            observer.stop()
+            observer.join(timeout=5)
+            monitor.stop()
+        if upload_queue is not None:
+            upload_queue.stop(timeout=5)
+
+watcher_manager = WatcherManager()
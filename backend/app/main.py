@@ -3,8 +3,11 @@ import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # Other settings imports can be added here as needed
-from .api import config, templates, watcher, sheets, images
-from db.config_db import init_default_template
+from .api import config, templates, watcher, sheets, images, enrichment, campaigns, jobs
+from db.config_db import init_default_template, interrupt_running_campaigns
+from .core.http import start_http_client, close_http_client
+from .core.jobs import job_queue
+from .core.watchers import watcher_manager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +33,17 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_default_template()
+    # Jobs don't survive a restart, so campaigns they were running can be resumed
+    interrupt_running_campaigns()
+    await start_http_client()
+    job_queue.start()
+    watcher_manager.start_uploads()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_http_client()
+    job_queue.stop()
+    watcher_manager.shutdown()
 
 # Include routers (no prefix to maintain compatibility with frontend)
 app.include_router(config.router, tags=["config"])
@@ -37,6 +51,9 @@ app.include_router(templates.router, tags=["templates"])
 app.include_router(watcher.router, tags=["watcher"])
 app.include_router(sheets.router, tags=["sheets"])
 app.include_router(images.router, tags=["images"])
+app.include_router(enrichment.router, tags=["enrichment"])
+app.include_router(campaigns.router, tags=["campaigns"])
+app.include_router(jobs.router, tags=["jobs"])
 
 @app.get("/")
 async def root():
@@ -1,16 +1,21 @@
 import os
 import ssl
+import copy
+import time
+import threading
 from dotenv import load_dotenv
 from .encryption import encryption
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from contextlib import contextmanager
 from pathlib import Path
-from sqlalchemy import create_engine, Column, String, Integer, Boolean, DateTime, ForeignKey, Text, ARRAY
+from sqlalchemy import create_engine, Column, String, Integer, BigInteger, Float, Boolean, DateTime, ForeignKey, Text, ARRAY, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import OperationalError as SQLAlchemyOperationalError
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 # Get the project root directory
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -25,8 +30,22 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set. Please ensure it is set in your .env file.")
 
+# Connection pool settings, shared by the ORM and the raw psycopg2 helpers
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Seconds before a connection is replaced
+
 # SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,  # Replace connections Render closed while idle
+    connect_args={"sslmode": "require"}  # Required for Render PostgreSQL
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -44,6 +63,19 @@ class UserConfig(Base):
     api_key = Column(Text)
     watched_file_types = Column(ARRAY(Text))
     api_endpoint = Column(Text)
+    enrichment_workers = Column(Integer)
+    enrichment_batch_size = Column(Integer)
+    smtp_send_interval = Column(Float)
+    smtp_send_burst = Column(Integer)
+    smtp_daily_limit = Column(Integer)
+    smtp_method = Column(Text)
+    smtp_method_port = Column(Integer)
+    openai_key_fingerprint = Column(Text)
+    openai_key_valid = Column(Boolean)
+    openai_key_checked_at = Column(DateTime)
+    campaign_weight = Column(Float)
+    campaign_max_concurrent = Column(Integer)
+    merge_contact_list = Column(Boolean)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -58,6 +90,97 @@ class UserTemplate(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class SmtpAccount(Base):
+    __tablename__ = "smtp_accounts"
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String(255), ForeignKey("user_configs.email"))
+    smtp_user = Column(Text)
+    smtp_pass = Column(Text)
+    smtp_server = Column(Text)
+    smtp_port = Column(Integer)
+    smtp_send_interval = Column(Float)
+    smtp_send_burst = Column(Integer)
+    smtp_daily_limit = Column(Integer)
+    smtp_method = Column(Text)
+    smtp_method_port = Column(Integer)
+    enabled = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CompanyEnrichment(Base):
+    __tablename__ = "company_enrichments"
+
+    company = Column(String(255), primary_key=True)
+    hq = Column(Text)
+    ftes = Column(Text)
+    description = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class SentEmail(Base):
+    __tablename__ = "sent_emails"
+    __table_args__ = (
+        UniqueConstraint("owner", "campaign_id", "recipient_normalized"),
+        Index("idx_sent_emails_recipient", "owner", "recipient_normalized"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    owner = Column(String(255), ForeignKey("user_configs.email"))
+    campaign_id = Column(String(64))
+    recipient = Column(String(255))
+    recipient_normalized = Column(String(255))
+    account = Column(String(255))
+    sent_at = Column(DateTime, default=datetime.utcnow)
+
+class Campaign(Base):
+    __tablename__ = "campaigns"
+
+    id = Column(String(64), primary_key=True)
+    owner = Column(String(255), ForeignKey("user_configs.email"))
+    sheet_url = Column(Text)
+    use_cc = Column(Boolean, default=False)
+    status = Column(String(20), default="running")
+    position = Column(Integer, default=-1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CampaignContact(Base):
+    __tablename__ = "campaign_contacts"
+
+    campaign_id = Column(String(64), ForeignKey("campaigns.id", ondelete="CASCADE"), primary_key=True)
+    row_index = Column(Integer, primary_key=True)
+    email = Column(String(255))
+    status = Column(String(20))
+    enrichment = Column(JSONB)
+    record = Column(JSONB)
+    account = Column(String(255))
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ContactListEntry(Base):
+    __tablename__ = "contact_list"
+    __table_args__ = (Index("idx_contact_list_company", "owner", "company"),)
+
+    owner = Column(String(255), primary_key=True)
+    email_normalized = Column(String(255), primary_key=True)
+    company = Column(Text)
+    record = Column(JSONB)  # Latest non-empty value of each output column
+    campaign_id = Column(String(64))  # Last campaign that emailed the contact
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class UploadHash(Base):
+    __tablename__ = "upload_hashes"
+    __table_args__ = (Index("idx_upload_hashes_last_seen", "owner", "last_seen_at"),)
+
+    owner = Column(String(255), primary_key=True)
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 of the file
+    perceptual_hash = Column(BigInteger)  # 64-bit difference hash, when computed
+    file_name = Column(Text)
+    hits = Column(Integer, default=0)  # Duplicates answered from this entry
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+
 # Create all tables
 Base.metadata.create_all(bind=engine)
 
@@ -76,6 +199,31 @@ SENSITIVE_FIELDS = {
     "smtp_pass",
 }
 
+# In-process cache of decrypted user configs: email -> (expires_at, config)
+USER_CONFIG_CACHE_TTL = float(os.getenv("USER_CONFIG_CACHE_TTL", 60))
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
+# Columns added to user_configs after the table was first created
+USER_CONFIG_MIGRATIONS = [
+    ("enrichment_workers", "INTEGER"),
+    ("enrichment_batch_size", "INTEGER"),
+    ("smtp_send_interval", "REAL"),
+    ("smtp_send_burst", "INTEGER"),
+    ("smtp_daily_limit", "INTEGER"),
+    ("smtp_method", "TEXT"),
+    ("smtp_method_port", "INTEGER"),
+    ("openai_key_fingerprint", "TEXT"),
+    ("openai_key_valid", "BOOLEAN"),
+    ("openai_key_checked_at", "TIMESTAMP"),
+    ("campaign_weight", "REAL"),
+    ("campaign_max_concurrent", "INTEGER"),
+    ("merge_contact_list", "BOOLEAN"),
+]
+
+# Changing any of these invalidates the stored SMTP connection method
+SMTP_CONNECTION_FIELDS = {"smtp_user", "smtp_pass", "smtp_server", "smtp_port"}
+
 DEFAULT_TEMPLATE = {
     "name": "Example Template",
     "content": """Hello [CIVILITY] [LAST_NAME],
@@ -91,20 +239,23 @@ Best regards,
 
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections."""
+    """
+    Context manager for database connections. Connections are borrowed from
+    the engine's pool and handed back (rolled back) on exit instead of closed.
+    """
     try:
-        # Configure SSL for Render PostgreSQL
-        conn = psycopg2.connect(
-            DATABASE_URL,
-            sslmode='require'  # Required for Render PostgreSQL
-        )
-        try:
-            yield conn
-        finally:
-            conn.close()
-    except psycopg2.OperationalError as e:
+        conn = engine.raw_connection()
+    except (psycopg2.OperationalError, SQLAlchemyOperationalError) as e:
         print(f"Database connection error: {str(e)}")
         raise
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def get_pool_status() -> str:
+    """Describe the connection pool's current usage, for debugging."""
+    return engine.pool.status()
 
 def init_db():
     """Initialize database tables if they don't exist."""
@@ -123,10 +274,27 @@ def init_db():
                     api_key TEXT,
                     watched_file_types TEXT[],
                     api_endpoint TEXT,
+                    enrichment_workers INTEGER,
+                    enrichment_batch_size INTEGER,
+                    smtp_send_interval REAL,
+                    smtp_send_burst INTEGER,
+                    smtp_daily_limit INTEGER,
+                    smtp_method TEXT,
+                    smtp_method_port INTEGER,
+                    openai_key_fingerprint TEXT,
+                    openai_key_valid BOOLEAN,
+                    openai_key_checked_at TIMESTAMP,
+                    campaign_weight REAL,
+                    campaign_max_concurrent INTEGER,
+                    merge_contact_list BOOLEAN,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+
+            # Add columns introduced after the table was first created
+            for column, column_type in USER_CONFIG_MIGRATIONS:
+                cur.execute(f"ALTER TABLE user_configs ADD COLUMN IF NOT EXISTS {column} {column_type}")
             
             # Create user_templates table
             cur.execute("""
@@ -141,6 +309,131 @@ def init_db():
                     FOREIGN KEY (email) REFERENCES user_configs(email)
                 )
             """)
+
+
+            # Create smtp_accounts table (extra sending mailboxes per user)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS smtp_accounts (
+                    id SERIAL PRIMARY KEY,
+                    email VARCHAR(255),
+                    smtp_user TEXT,
+                    smtp_pass TEXT,
+                    smtp_server TEXT,
+                    smtp_port INTEGER,
+                    smtp_send_interval REAL,
+                    smtp_send_burst INTEGER,
+                    smtp_daily_limit INTEGER,
+                    smtp_method TEXT,
+                    smtp_method_port INTEGER,
+                    enabled BOOLEAN DEFAULT TRUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (email) REFERENCES user_configs(email)
+                )
+            """)
+
+            # Create smtp_send_quota table (emails sent per mailbox per day)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS smtp_send_quota (
+                    account VARCHAR(255),
+                    day DATE DEFAULT CURRENT_DATE,
+                    sent INTEGER DEFAULT 0,
+                    PRIMARY KEY (account, day)
+                )
+            """)
+
+            # Create company_enrichments table (cached GPT company details)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS company_enrichments (
+                    company VARCHAR(255) PRIMARY KEY,
+                    hq TEXT,
+                    ftes TEXT,
+                    description TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Create sent_emails table (append-only ledger, one row per recipient per campaign)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS sent_emails (
+                    id SERIAL PRIMARY KEY,
+                    owner VARCHAR(255) REFERENCES user_configs(email),
+                    campaign_id VARCHAR(64),
+                    recipient VARCHAR(255),
+                    recipient_normalized VARCHAR(255),
+                    account VARCHAR(255),
+                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (owner, campaign_id, recipient_normalized)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_sent_emails_recipient
+                ON sent_emails (owner, recipient_normalized)
+            """)
+
+            # Create campaigns and campaign_contacts tables (resumable campaign checkpoints)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS campaigns (
+                    id VARCHAR(64) PRIMARY KEY,
+                    owner VARCHAR(255) REFERENCES user_configs(email),
+                    sheet_url TEXT,
+                    use_cc BOOLEAN DEFAULT FALSE,
+                    status VARCHAR(20) DEFAULT 'running',
+                    position INTEGER DEFAULT -1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS campaign_contacts (
+                    campaign_id VARCHAR(64) REFERENCES campaigns(id) ON DELETE CASCADE,
+                    row_index INTEGER,
+                    email VARCHAR(255),
+                    status VARCHAR(20),
+                    enrichment JSONB,
+                    record JSONB,
+                    account VARCHAR(255),
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (campaign_id, row_index)
+                )
+            """)
+
+            # Contacts of every campaign, merged by email, for the CRM export
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS contact_list (
+                    owner VARCHAR(255),
+                    email_normalized VARCHAR(255),
+                    company TEXT,
+                    record JSONB,
+                    campaign_id VARCHAR(64),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (owner, email_normalized)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_contact_list_company
+                ON contact_list (owner, company)
+            """)
+
+            # Screenshots already sent to the processing API, to skip duplicates
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS upload_hashes (
+                    owner VARCHAR(255),
+                    content_hash VARCHAR(64),
+                    perceptual_hash BIGINT,
+                    file_name TEXT,
+                    hits INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (owner, content_hash)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_upload_hashes_last_seen
+                ON upload_hashes (owner, last_seen_at)
+            """)
             
             conn.commit()
 
@@ -190,8 +483,18 @@ def decrypt_sensitive_fields(config: Dict[str, Any]) -> Dict[str, Any]:
     
     return decrypted_config
 
+def smtp_connection_changed(new: dict, current: Optional[dict]) -> bool:
+    """Whether `new` changes any setting the stored SMTP connection method depends on."""
+    current = current or {}
+    return any(
+        str(new[field]) != str(current.get(field))
+        for field in SMTP_CONNECTION_FIELDS if field in new
+    )
+
 def save_user_config(email: str, config: dict):
     encrypted_config = encrypt_sensitive_fields(config)
+    if smtp_connection_changed(config, get_user_config(email, use_cache=False)):
+        encrypted_config.update(smtp_method=None, smtp_method_port=None)
     known_columns = {col.name for col in UserConfig.__table__.columns if col.name != "email"}
     valid_fields = [k for k in encrypted_config if k in known_columns]
     
@@ -211,8 +514,19 @@ def save_user_config(email: str, config: dict):
             """
             cur.execute(query, [email] + values)
             conn.commit()
+    invalidate_user_config(email)
+
+def get_user_config(email: str, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Get the user's decrypted configuration. Results are cached in-process for
+    USER_CONFIG_CACHE_TTL seconds; pass use_cache=False to read the database.
+    """
+    if use_cache:
+        with _config_cache_lock:
+            cached = _config_cache.get(email)
+        if cached and cached[0] > time.monotonic():
+            return copy.deepcopy(cached[1])
 
-def get_user_config(email: str) -> Optional[Dict[str, Any]]:
     try:
         with get_db_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -221,11 +535,21 @@ def get_user_config(email: str) -> Optional[Dict[str, Any]]:
                 if not config:
                     return None
                 config_dict = decrypt_sensitive_fields(dict(config))
-                return config_dict
+                with _config_cache_lock:
+                    _config_cache[email] = (time.monotonic() + USER_CONFIG_CACHE_TTL, config_dict)
+                return copy.deepcopy(config_dict)
     except Exception as e:
         print(f"Error getting user config: {str(e)}")
         return None
 
+def invalidate_user_config(email: Optional[str] = None):
+    """Drop a user's cached configuration, or every cached configuration."""
+    with _config_cache_lock:
+        if email is None:
+            _config_cache.clear()
+        else:
+            _config_cache.pop(email, None)
+
 def get_user_templates(email: str):
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -235,6 +559,23 @@ def get_user_templates(email: str):
             """, (email,))
             return [dict(row) for row in cur.fetchall()]
 
+def get_user_template_versions(email: str):
+    """Get the id, name and updated_at of the user's templates, without their content."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT id, name, is_default, updated_at FROM user_templates
+                WHERE email = %s OR is_default = TRUE
+            """, (email,))
+            return [dict(row) for row in cur.fetchall()]
+
+def get_template_content(template_id: int):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT content FROM user_templates WHERE id = %s", (template_id,))
+            row = cur.fetchone()
+            return row[0] if row else None
+
 def save_template(email: str, template: dict):
     with get_db_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -272,5 +613,418 @@ def update_template(email: str, template_name: str, updated_template: dict):
             conn.commit()
             return dict(updated) if updated else None
 
+SMTP_ACCOUNT_FIELDS = [
+    "smtp_user", "smtp_pass", "smtp_server", "smtp_port",
+    "smtp_send_interval", "smtp_send_burst", "smtp_daily_limit", "enabled"
+]
+
+def get_smtp_accounts(email: str):
+    """Get the user's extra SMTP accounts with decrypted passwords."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM smtp_accounts WHERE email = %s ORDER BY id", (email,))
+            return [decrypt_sensitive_fields(dict(row)) for row in cur.fetchall()]
+
+def save_smtp_account(email: str, account: dict):
+    """Create an SMTP account, or update it when `account` has an id."""
+    encrypted_account = encrypt_sensitive_fields(account)
+    current = None
+    if account.get("id"):
+        current = next((a for a in get_smtp_accounts(email) if a["id"] == account["id"]), None)
+    if smtp_connection_changed(account, current):
+        encrypted_account.update(smtp_method=None, smtp_method_port=None)
+    fields = [k for k in SMTP_ACCOUNT_FIELDS + ["smtp_method", "smtp_method_port"] if k in encrypted_account]
+    values = [encrypted_account[k] for k in fields]
+
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if account.get("id"):
+                if not fields:
+                    return None
+                cur.execute(f"""
+                    UPDATE smtp_accounts
+                    SET {', '.join(f"{k} = %s" for k in fields)}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = %s AND email = %s
+                    RETURNING *
+                """, values + [account["id"], email])
+            else:
+                cur.execute(f"""
+                    INSERT INTO smtp_accounts (email, {', '.join(fields)})
+                    VALUES (%s, {', '.join(["%s"] * len(fields))})
+                    RETURNING *
+                """, [email] + values)
+            saved = cur.fetchone()
+            conn.commit()
+            return decrypt_sensitive_fields(dict(saved)) if saved else None
+
+def delete_smtp_account(email: str, account_id: int):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM smtp_accounts
+                WHERE id = %s AND email = %s
+                RETURNING id
+            """, (account_id, email))
+            deleted = cur.fetchone() is not None
+            conn.commit()
+            return deleted
+
+def save_smtp_method(email: str, method: str, port: int, account_id: Optional[int] = None):
+    """Remember which SMTP connection method works for the user's main or extra account."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            if account_id is None:
+                cur.execute("""
+                    UPDATE user_configs SET smtp_method = %s, smtp_method_port = %s
+                    WHERE email = %s
+                """, (method, port, email))
+            else:
+                cur.execute("""
+                    UPDATE smtp_accounts SET smtp_method = %s, smtp_method_port = %s
+                    WHERE id = %s AND email = %s
+                """, (method, port, account_id, email))
+            conn.commit()
+    if account_id is None:
+        invalidate_user_config(email)
+
+def save_openai_key_status(email: str, fingerprint: str, valid: bool):
+    """Store the outcome of validating the user's OpenAI key, identified by its fingerprint."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE user_configs
+                SET openai_key_fingerprint = %s, openai_key_valid = %s,
+                    openai_key_checked_at = CURRENT_TIMESTAMP
+                WHERE email = %s
+            """, (fingerprint, valid, email))
+            conn.commit()
+    invalidate_user_config(email)
+
+def invalidate_openai_key_status(email: str):
+    """Force the user's OpenAI key to be validated again before the next campaign."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE user_configs SET openai_key_valid = FALSE
+                WHERE email = %s
+            """, (email,))
+            conn.commit()
+    invalidate_user_config(email)
+
+def get_smtp_sent_today(account: str) -> int:
+    """Number of emails an SMTP account has sent today."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT sent FROM smtp_send_quota
+                WHERE account = %s AND day = CURRENT_DATE
+            """, (account,))
+            row = cur.fetchone()
+            return row[0] if row else 0
+
+def increment_smtp_sent(account: str) -> int:
+    """Count one more email for an SMTP account today and return the new total."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO smtp_send_quota (account, day, sent)
+                VALUES (%s, CURRENT_DATE, 1)
+                ON CONFLICT (account, day) DO UPDATE SET
+                sent = smtp_send_quota.sent + 1
+                RETURNING sent
+            """, (account,))
+            sent = cur.fetchone()[0]
+            conn.commit()
+            return sent
+
+def get_company_enrichment(company: str, max_age_days: int) -> Optional[Dict[str, Any]]:
+    """Get cached company details if they are younger than `max_age_days`."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT hq, ftes, description FROM company_enrichments
+                WHERE company = %s AND updated_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+            """, (company, max_age_days))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+def save_company_enrichment(company: str, details: dict):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO company_enrichments (company, hq, ftes, description)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (company) DO UPDATE SET
+                hq = EXCLUDED.hq,
+                ftes = EXCLUDED.ftes,
+                description = EXCLUDED.description,
+                updated_at = CURRENT_TIMESTAMP
+            """, (company, details.get("hq", ""), details.get("ftes", ""), details.get("description", "")))
+            conn.commit()
+
+def delete_company_enrichment(company: str) -> int:
+    """
+    Drop one company from the enrichment cache. The cache is shared by all
+    users, so there is deliberately no way to flush it whole from here.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM company_enrichments WHERE company = %s", (company,))
+            deleted = cur.rowcount
+            conn.commit()
+            return deleted
+
+def normalize_email(address: str) -> str:
+    return str(address).strip().lower()
+
+def record_sent_email(owner: str, campaign_id: str, recipient: str, account: str):
+    """Append a sent email to the ledger."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sent_emails (owner, campaign_id, recipient, recipient_normalized, account)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (owner, campaign_id, recipient_normalized) DO NOTHING
+            """, (owner, campaign_id, recipient, normalize_email(recipient), account))
+            conn.commit()
+
+def get_contacted_recipients(owner: str, addresses) -> set:
+    """
+    Return which of `addresses` (already normalised) the user has emailed
+    before, in a single query.
+    """
+    addresses = list(addresses)
+    if not addresses:
+        return set()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT DISTINCT recipient_normalized FROM sent_emails
+                WHERE owner = %s AND recipient_normalized = ANY(%s)
+            """, (owner, addresses))
+            return {row[0] for row in cur.fetchall()}
+
+def create_campaign(campaign_id: str, owner: str, sheet_url: str, use_cc: bool = False) -> Dict[str, Any]:
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                INSERT INTO campaigns (id, owner, sheet_url, use_cc)
+                VALUES (%s, %s, %s, %s)
+                RETURNING *
+            """, (campaign_id, owner, sheet_url, use_cc))
+            campaign = cur.fetchone()
+            conn.commit()
+            return dict(campaign)
+
+def get_campaign(campaign_id: str) -> Optional[Dict[str, Any]]:
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT * FROM campaigns WHERE id = %s", (campaign_id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+def get_user_campaigns(owner: str):
+    """Get the user's campaigns, newest first, with their number of sent emails."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT c.*, COUNT(cc.row_index) FILTER (WHERE cc.status = 'sent') AS sent
+                FROM campaigns c
+                LEFT JOIN campaign_contacts cc ON cc.campaign_id = c.id
+                WHERE c.owner = %s
+                GROUP BY c.id
+                ORDER BY c.created_at DESC
+            """, (owner,))
+            return [dict(row) for row in cur.fetchall()]
+
+# A campaign can only be resumed from these; "running" means a job still owns it
+RESUMABLE_CAMPAIGN_STATUSES = ("paused", "incomplete", "failed", "interrupted")
+
+def claim_campaign(campaign_id: str, owner: str) -> bool:
+    """
+    Move the user's campaign back to running if it is resumable. The check
+    and the update are one statement, so of two resume requests for the
+    same campaign only one gets it. Returns whether the campaign was claimed.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE campaigns SET status = 'running', updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND owner = %s AND status = ANY(%s)
+            """, (campaign_id, owner, list(RESUMABLE_CAMPAIGN_STATUSES)))
+            claimed = cur.rowcount == 1
+            conn.commit()
+            return claimed
+
+def interrupt_running_campaigns() -> int:
+    """
+    Mark campaigns left running by a previous server process as interrupted,
+    so they can be resumed. Campaign jobs only run in the server process, so
+    none of them can still be running at startup.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE campaigns SET status = 'interrupted', updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'running'
+            """)
+            interrupted = cur.rowcount
+            conn.commit()
+            return interrupted
+
+def update_campaign_status(campaign_id: str, status: str):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE campaigns SET status = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (status, campaign_id))
+            conn.commit()
+
+def save_campaign_checkpoints(campaign_id: str, contacts, position: int, contact_owner: Optional[str] = None):
+    """
+    Upsert the state of several campaign contacts and the campaign's
+    position in one transaction. `contacts` holds dicts with row_index,
+    email, status and optionally enrichment, record and account. With
+    `contact_owner`, the records of sent contacts are also merged into that
+    user's contact list.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO campaign_contacts (campaign_id, row_index, email, status, enrichment, record, account)
+                VALUES %s
+                ON CONFLICT (campaign_id, row_index) DO UPDATE SET
+                email = EXCLUDED.email,
+                status = EXCLUDED.status,
+                enrichment = COALESCE(EXCLUDED.enrichment, campaign_contacts.enrichment),
+                record = COALESCE(EXCLUDED.record, campaign_contacts.record),
+                account = COALESCE(EXCLUDED.account, campaign_contacts.account),
+                updated_at = CURRENT_TIMESTAMP
+            """, [(
+                campaign_id, contact["row_index"], contact.get("email"), contact["status"],
+                Json(contact["enrichment"]) if contact.get("enrichment") is not None else None,
+                Json(contact["record"]) if contact.get("record") is not None else None,
+                contact.get("account")
+            ) for contact in contacts])
+            cur.execute("""
+                UPDATE campaigns SET position = GREATEST(position, %s), updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+            """, (position, campaign_id))
+            if contact_owner:
+                sent = [contact["record"] for contact in contacts if contact["status"] == "sent" and contact.get("record")]
+                upsert_contact_list(cur, contact_owner, campaign_id, sent)
+            conn.commit()
+
+def upsert_contact_list(cur, owner: str, campaign_id: str, records):
+    """
+    Merge sent contact records into the user's contact list by email. Empty
+    values don't overwrite what is stored, so a contact keeps the details
+    of earlier campaigns while status and last_contact move forward.
+    """
+    merged = {}
+    for record in records:
+        if record.get("email"):
+            values = {key: value for key, value in record.items() if value not in (None, "")}
+            merged[normalize_email(record["email"])] = values  # One row per email in a statement
+    if not merged:
+        return
+    execute_values(cur, """
+        INSERT INTO contact_list (owner, email_normalized, company, record, campaign_id)
+        VALUES %s
+        ON CONFLICT (owner, email_normalized) DO UPDATE SET
+        company = COALESCE(EXCLUDED.company, contact_list.company),
+        record = contact_list.record || EXCLUDED.record,
+        campaign_id = EXCLUDED.campaign_id,
+        updated_at = CURRENT_TIMESTAMP
+    """, [
+        (owner, email_normalized, values.get("company"), Json(values), campaign_id)
+        for email_normalized, values in merged.items()
+    ])
+
+def get_contact_list(owner: str) -> List[Dict[str, Any]]:
+    """Get the records of the user's contact list, in the order contacts were added."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT record FROM contact_list WHERE owner = %s
+                ORDER BY created_at, email_normalized
+            """, (owner,))
+            return [row["record"] for row in cur.fetchall()]
+
+def find_upload_hash(owner: str, content_hash: str, perceptual_hash: Optional[int] = None,
+                     max_distance: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Find an earlier upload of the same screenshot: same content hash, or a
+    perceptual hash at most `max_distance` bits away. A match counts as a
+    hit and is kept from eviction.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if perceptual_hash is None:
+                cur.execute("""
+                    SELECT content_hash, file_name FROM upload_hashes
+                    WHERE owner = %s AND content_hash = %s
+                """, (owner, content_hash))
+            else:
+                # Hamming distance between the two 64-bit hashes
+                cur.execute("""
+                    SELECT content_hash, file_name FROM upload_hashes
+                    WHERE owner = %s AND (
+                        content_hash = %s OR (
+                            perceptual_hash IS NOT NULL
+                            AND length(replace(((perceptual_hash # %s::bigint)::bit(64))::text, '0', '')) <= %s
+                        )
+                    )
+                    ORDER BY content_hash = %s DESC, last_seen_at DESC
+                    LIMIT 1
+                """, (owner, content_hash, perceptual_hash, max_distance, content_hash))
+            match = cur.fetchone()
+            if match is None:
+                return None
+            cur.execute("""
+                UPDATE upload_hashes SET hits = hits + 1, last_seen_at = CURRENT_TIMESTAMP
+                WHERE owner = %s AND content_hash = %s
+            """, (owner, match["content_hash"]))
+            conn.commit()
+            return dict(match)
+
+def save_upload_hash(owner: str, content_hash: str, perceptual_hash: Optional[int], file_name: str,
+                     max_entries: int, max_age_days: int):
+    """
+    Remember an upload the processing API accepted, then evict the user's
+    entries unused for `max_age_days` and the least recently used ones
+    beyond `max_entries`.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO upload_hashes (owner, content_hash, perceptual_hash, file_name)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (owner, content_hash) DO UPDATE SET
+                last_seen_at = CURRENT_TIMESTAMP
+            """, (owner, content_hash, perceptual_hash, file_name))
+            cur.execute("""
+                DELETE FROM upload_hashes
+                WHERE owner = %s AND (
+                    last_seen_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+                    OR content_hash IN (
+                        SELECT content_hash FROM upload_hashes WHERE owner = %s
+                        ORDER BY last_seen_at DESC OFFSET %s
+                    )
+                )
+            """, (owner, max_age_days, owner, max_entries))
+            conn.commit()
+
+def get_campaign_checkpoints(campaign_id: str) -> Dict[int, Dict[str, Any]]:
+    """Get the saved state of a campaign's contacts keyed by row index."""
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT row_index, email, status, enrichment, record, account
+                FROM campaign_contacts WHERE campaign_id = %s
+            """, (campaign_id,))
+            return {row["row_index"]: dict(row) for row in cur.fetchall()}
+
 # Initialize database on module import
 init_db()
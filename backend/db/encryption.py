@@ -1,5 +1,7 @@
 from cryptography.fernet import Fernet
 import os
+import hmac
+import hashlib
 from pathlib import Path
 import base64
 from cryptography.hazmat.primitives import hashes
@@ -45,5 +47,9 @@ class Encryption:
             print(f"Error decrypting data: {str(e)}")
             raise ValueError(f"Failed to decrypt data: {str(e)}")
 
+    def fingerprint(self, data: str) -> str:
+        """Return a keyed hash that identifies a secret without storing it."""
+        return hmac.new(self.key, data.encode(), hashlib.sha256).hexdigest()
+
 # Create a singleton instance
 encryption = Encryption() 
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Benchmark for contact preparation before the send loop.
+
+Compares the legacy per-row preparation (iterrows, scalar school/subject
+helpers, field-by-field output dicts) with the columnar stage in
+scripts.contacts on a synthetic sheet. Enrichment and sending are left
+out, since both paths hand the same rows to them.
+
+    python -m scripts.bench_contact_prep [rows]
+"""
+import sys
+import time
+import pandas as pd
+from scripts.contacts import get_subject, iter_prepared_contacts
+from scripts.sheet_fetch import SHEET_CHUNK_SIZE
+
+DEFAULT_ROWS = 50_000
+OUTPUT_COLUMNS = [
+    "company", "account_owner", "status", "industry", "HQ", "FTEs", "description",
+    "first_name", "last_name", "email", "role", "education", "location", "notes", "added", "last_contact"
+]
+ENRICHED = {"language": "French", "hq": "Paris", "ftes": "~100k", "description": "Bank"}
+
+def make_sheet(rows):
+    return pd.DataFrame({
+        "first_name": [f"First{i}" for i in range(rows)],
+        "last_name": [f"Last{i}" for i in range(rows)],
+        # One contact in ten is a duplicate
+        "email": [f"contact{i % (rows - rows // 10)}@example.com" for i in range(rows)],
+        "company": [f"Company {i % 500}" for i in range(rows)],
+        "role": ["Head of Research"] * rows,
+        "education": ["HEC Paris" if i % 3 else None for i in range(rows)],
+        "location": ["Paris, France"] * rows,
+    })
+
+def legacy_school(education):
+    if pd.isna(education):
+        return "École polytechnique"
+    return "HEC Paris" if str(education).strip().lower() == "hec paris" else "École polytechnique"
+
+def legacy_prepare(df, today_str):
+    seen_emails = set()
+    jobs = []
+    for _, row in df.iterrows():
+        if row['email'] in seen_emails:
+            continue
+        seen_emails.add(row['email'])
+        school = legacy_school(row["education"])
+        subject = get_subject(ENRICHED["language"], school)
+        jobs.append((subject, {
+            "company": row["company"],
+            "account_owner": "",
+            "status": "Contacted",
+            "industry": "",
+            "HQ": ENRICHED.get("hq", ""),
+            "FTEs": ENRICHED.get("ftes", ""),
+            "description": ENRICHED.get("description", ""),
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "email": row["email"],
+            "role": row["role"],
+            "education": row["education"],
+            "location": row["location"],
+            "notes": "",
+            "added": "",
+            "last_contact": today_str
+        }))
+    return jobs
+
+def columnar_prepare(df, today_str):
+    chunks = (df[start:start + SHEET_CHUNK_SIZE] for start in range(0, len(df), SHEET_CHUNK_SIZE))
+    jobs = []
+    for row in iter_prepared_contacts(chunks, today_str):
+        if row["duplicate"]:
+            continue
+        subject = row["subject_fr"] if ENRICHED["language"] == "French" else row["subject_en"]
+        record = {column: row.get(column, "") for column in OUTPUT_COLUMNS}
+        record["HQ"] = ENRICHED.get("hq", "")
+        record["FTEs"] = ENRICHED.get("ftes", "")
+        record["description"] = ENRICHED.get("description", "")
+        jobs.append((subject, record))
+    return jobs
+
+def timed(prepare, df, today_str):
+    start = time.perf_counter()
+    jobs = prepare(df, today_str)
+    return time.perf_counter() - start, jobs
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    df = make_sheet(rows)
+    today_str = "January 01, 2025"
+    legacy_time, legacy_jobs = timed(legacy_prepare, df, today_str)
+    columnar_time, columnar_jobs = timed(columnar_prepare, df, today_str)
+    print(f"{rows} rows: legacy {legacy_time:.2f}s ({len(legacy_jobs)} contacts), "
+          f"columnar {columnar_time:.2f}s ({len(columnar_jobs)} contacts), "
+          f"{legacy_time / columnar_time:.1f}x faster")
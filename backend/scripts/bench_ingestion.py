@@ -0,0 +1,109 @@
+"""
+Memory benchmark for campaign sheet ingestion.
+
+Serves generated contact sheets over a local HTTP server and compares the
+peak Python memory of the legacy path (whole export in memory, preview
+records, every sent record kept in a list) with the streaming path
+(export spooled to disk past SHEET_CACHE_MAX_BYTES, chunked CSV reads,
+sent records spooled to disk).
+
+    python -m scripts.bench_ingestion [rows ...]
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+import tracemalloc
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import requests
+from scripts.sheet_fetch import SHEET_CACHE_MAX_BYTES, SentContactSpool, iter_sheet_chunks
+
+DEFAULT_SIZES = [10_000, 100_000]
+# Streaming peak at the largest size may grow by at most this factor over the
+# smallest, plus the export kept in memory before it is spooled to disk
+MAX_STREAMING_GROWTH = 1.5
+
+RECORD_COLUMNS = [
+    "company", "account_owner", "status", "industry", "HQ", "FTEs", "description",
+    "first_name", "last_name", "email", "role", "education", "location", "notes", "added", "last_contact"
+]
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def write_sheet(path, rows):
+    pd.DataFrame({
+        "first_name": [f"First{i}" for i in range(rows)],
+        "last_name": [f"Last{i}" for i in range(rows)],
+        "email": [f"contact{i}@example.com" for i in range(rows)],
+        "company": [f"Company {i % 500}" for i in range(rows)],
+        "role": ["Head of Research"] * rows,
+        "education": ["École polytechnique"] * rows,
+        "location": ["Paris, France"] * rows,
+    }).to_csv(path, index=False)
+
+def to_record(row):
+    record = dict.fromkeys(RECORD_COLUMNS, "")
+    for column in ("company", "first_name", "last_name", "email", "role", "education", "location"):
+        record[column] = row[column]
+    return record
+
+def legacy_ingest(csv_url):
+    response = requests.get(csv_url, timeout=10)
+    response.raise_for_status()
+    df = pd.read_csv(io.BytesIO(response.content), encoding="utf-8")
+    preview_data = df.to_dict('records')
+    enriched_rows = [to_record(row) for _, row in df.iterrows()]
+    return len(preview_data), len(enriched_rows)
+
+def streaming_ingest(csv_url):
+    spool = SentContactSpool(RECORD_COLUMNS)
+    rows = 0
+    try:
+        for chunk in iter_sheet_chunks(None, csv_url=csv_url):
+            for _, row in chunk.iterrows():
+                spool.append(to_record(row))
+                rows += 1
+    finally:
+        spool.close()
+    return rows, spool.count
+
+def measure(ingest, csv_url):
+    tracemalloc.start()
+    try:
+        ingest(csv_url)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(sizes=DEFAULT_SIZES):
+    with tempfile.TemporaryDirectory() as directory:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=directory))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        results = []
+        try:
+            for rows in sizes:
+                name = f"sheet_{rows}.csv"
+                write_sheet(os.path.join(directory, name), rows)
+                csv_url = f"{base_url}/{name}"
+                legacy = measure(legacy_ingest, csv_url)
+                streaming = measure(streaming_ingest, csv_url)
+                results.append((rows, legacy, streaming))
+                print(f"{rows:>8} rows: legacy peak {legacy / 2**20:8.1f} MiB, streaming peak {streaming / 2**20:6.1f} MiB")
+        finally:
+            server.shutdown()
+    return results
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    results = run(sizes)
+    smallest, largest = results[0][2], results[-1][2]
+    if len(results) > 1 and largest > smallest * MAX_STREAMING_GROWTH + SHEET_CACHE_MAX_BYTES:
+        print(f"✕ Streaming peak grew from {smallest / 2**20:.1f} to {largest / 2**20:.1f} MiB")
+        sys.exit(1)
+    print("✓ Streaming peak memory stays flat")
@@ -0,0 +1,97 @@
+"""
+Benchmark for writing the updated contact list at the end of a campaign.
+
+Compares the legacy output (groupby with a Python lambda per column, then
+to_excel through openpyxl) with the vectorised company grouping and the
+constant memory xlsx writer in scripts.excel_output, on synthetic lists of
+sent contacts. Reports time and peak Python memory of each step, and
+checks that both produce the same cells.
+
+    python -m scripts.bench_output [rows ...]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import pandas as pd
+from scripts.excel_output import group_by_company, write_xlsx
+
+DEFAULT_SIZES = [10_000, 100_000]
+CONTACTS_PER_COMPANY = 4
+OUTPUT_COLUMNS = [
+    "company", "account_owner", "status", "industry", "HQ", "FTEs", "description",
+    "first_name", "last_name", "email", "role", "education", "location", "notes", "added", "last_contact"
+]
+
+def make_sent_contacts(rows):
+    companies = max(rows // CONTACTS_PER_COMPANY, 1)
+    return pd.DataFrame({
+        "company": [f"Company {i % companies}" for i in range(rows)],
+        "account_owner": [None] * rows,
+        "status": ["Contacted"] * rows,
+        "industry": [None] * rows,
+        "HQ": ["Paris" if i % 2 else "Lyon" for i in range(rows)],
+        "FTEs": ["~1k"] * rows,
+        "description": [f"Description of company {i % companies}" for i in range(rows)],
+        "first_name": [f"First{i}" for i in range(rows)],
+        "last_name": [f"Last{i}" for i in range(rows)],
+        "email": [f"contact{i}@example.com" for i in range(rows)],
+        "role": ["Head of Research" if i % 3 else "CTO" for i in range(rows)],
+        "education": ["HEC Paris" if i % 3 else None for i in range(rows)],
+        "location": ["Paris, France"] * rows,
+        "notes": [None] * rows,
+        "added": [None] * rows,
+        "last_contact": ["January 01, 2025"] * rows,
+    })
+
+def legacy_group(df):
+    return df.groupby("company").agg(lambda x: "\n".join(x.dropna().astype(str).unique())).reset_index()[OUTPUT_COLUMNS]
+
+def legacy_write(df, path):
+    df.to_excel(path, index=False, engine='openpyxl')
+
+def vectorised_group(df):
+    return group_by_company(df, OUTPUT_COLUMNS)
+
+def streaming_write(df, path):
+    write_xlsx(path, OUTPUT_COLUMNS, [df])
+
+def measure(step, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = step(*args)
+        return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(sizes=DEFAULT_SIZES):
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            df = make_sent_contacts(rows)
+            legacy_df, legacy_group_time, legacy_group_peak = measure(legacy_group, df)
+            grouped_df, group_time, group_peak = measure(vectorised_group, df)
+            if not legacy_df.astype(object).equals(grouped_df.astype(object)):
+                print(f"✕ Grouped output differs at {rows} rows")
+                sys.exit(1)
+
+            legacy_path = os.path.join(directory, f"legacy_{rows}.xlsx")
+            streaming_path = os.path.join(directory, f"streaming_{rows}.xlsx")
+            _, legacy_write_time, legacy_write_peak = measure(legacy_write, legacy_df, legacy_path)
+            _, write_time, write_peak = measure(streaming_write, grouped_df, streaming_path)
+            written = pd.read_excel(streaming_path, dtype=str).fillna("")
+            if not written.equals(pd.read_excel(legacy_path, dtype=str).fillna("")):
+                print(f"✕ Written file differs at {rows} rows")
+                sys.exit(1)
+
+            print(f"{rows:>8} rows ({len(grouped_df)} companies):")
+            print(f"    group  legacy {legacy_group_time:7.2f}s {legacy_group_peak / 2**20:7.1f} MiB, "
+                  f"vectorised {group_time:6.2f}s {group_peak / 2**20:6.1f} MiB")
+            print(f"    write  legacy {legacy_write_time:7.2f}s {legacy_write_peak / 2**20:7.1f} MiB, "
+                  f"streaming  {write_time:6.2f}s {write_peak / 2**20:6.1f} MiB")
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    run(sizes)
+    print("✓ Same output from both paths")
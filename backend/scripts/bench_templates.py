@@ -0,0 +1,51 @@
+"""
+Benchmark for email body rendering.
+
+Renders the same bodies with the legacy per-placeholder str.replace loop
+and with a compiled template, and checks both produce identical output.
+
+    python -m scripts.bench_templates [recipients]
+"""
+import sys
+import time
+from scripts.template_engine import CompiledTemplate
+
+DEFAULT_RECIPIENTS = 10_000
+
+TEMPLATE = """<p>Bonjour [CIVILITÉ] [LAST_NAME],</p>
+<p>Étudiant à [SCHOOL], je travaille sur un projet de structuration de données
+et j'aimerais échanger avec vous sur la manière dont [COMPANY] aborde le sujet.</p>
+""" + "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n" * 20 + "<p>Bien à vous,</p>"
+
+def legacy_fill_template(template, placeholders):
+    for key, value in placeholders.items():
+        template = template.replace(f"[{key.upper()}]", value)
+    return template
+
+def make_placeholders(recipients):
+    return [{
+        "CIVILITÉ": "Madame" if i % 2 else "Monsieur",
+        "CIVILITY": "Ms" if i % 2 else "Mr",
+        "LAST_NAME": f"Last{i}",
+        "COMPANY": f"Company {i % 500}",
+        "SCHOOL": "HEC Paris"
+    } for i in range(recipients)]
+
+if __name__ == "__main__":
+    recipients = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECIPIENTS
+    rows = make_placeholders(recipients)
+
+    start = time.perf_counter()
+    legacy = [legacy_fill_template(TEMPLATE, placeholders) for placeholders in rows]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = CompiledTemplate(TEMPLATE)
+    bodies = compiled.render_many(rows)
+    compiled_time = time.perf_counter() - start
+
+    if bodies != legacy:
+        print("✕ Compiled rendering differs from the legacy output")
+        sys.exit(1)
+    print(f"{recipients} bodies: legacy {legacy_time * 1000:.1f} ms, compiled {compiled_time * 1000:.1f} ms "
+          f"({legacy_time / compiled_time:.1f}x faster)")
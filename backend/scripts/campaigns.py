@@ -0,0 +1,112 @@
+import os
+import threading
+import pandas as pd
+from db.config_db import save_campaign_checkpoints, get_contact_list
+from scripts.contacts import OUTPUT_COLUMNS
+from scripts.excel_output import group_by_company, write_xlsx
+
+# === CHECKPOINT SETTINGS ===
+CHECKPOINT_BATCH_SIZE = int(os.getenv("CHECKPOINT_BATCH_SIZE", 50))  # Contact updates per write
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", 2))  # Max seconds an update waits
+
+def to_json_value(value):
+    """Replace NaN with None so a value can be stored as JSON."""
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    if value is not None and not isinstance(value, (str, bool)) and pd.isna(value):
+        return None
+    return value
+
+class CampaignCheckpointer:
+    """
+    Saves the state of each campaign contact (enrichment, send status) and
+    the campaign's position in the sheet. Updates are buffered and written
+    by a background thread in batches of `batch_size`, or every `interval`
+    seconds, so the send loop never waits on the database. With
+    `contact_owner`, sent records are merged into that user's contact list
+    in the same writes.
+    """
+
+    def __init__(self, campaign_id, batch_size=CHECKPOINT_BATCH_SIZE, interval=CHECKPOINT_INTERVAL, contact_owner=None):
+        self.campaign_id = campaign_id
+        self.contact_owner = contact_owner
+        self.batch_size = batch_size
+        self.interval = interval
+        self.position = -1
+        self.writes = 0
+        self._pending = {}  # row_index -> state merged since the last write
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"checkpoint-{campaign_id[:8]}", daemon=True)
+        self._thread.start()
+
+    def enriched(self, row, enrichment):
+        self._update(row["row_index"], email=row["email"], status="enriched", enrichment=to_json_value(enrichment))
+
+    def sent(self, job, account):
+        self._update(job["row_index"], email=job["email"], status="sent", record=to_json_value(job["record"]), account=account)
+
+    def _update(self, row_index, **state):
+        with self._lock:
+            self._pending.setdefault(row_index, {"row_index": row_index}).update(state)
+            self.position = max(self.position, row_index)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            position = self.position
+        if not pending:
+            return
+        try:
+            save_campaign_checkpoints(self.campaign_id, list(pending.values()), position, contact_owner=self.contact_owner)
+            self.writes += 1
+        except Exception as e:
+            print(f"Error saving checkpoint for campaign {self.campaign_id}: {str(e)}")
+            # Keep the updates for the next write, under anything newer
+            with self._lock:
+                for row_index, state in pending.items():
+                    self._pending[row_index] = {**state, **self._pending.get(row_index, {})}
+
+    def close(self):
+        """Stop the writer thread and write what is left."""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+def apply_checkpoints(rows, checkpoints):
+    """
+    Annotate prepared rows with what a resumed campaign already did for
+    them: `resumed_record` for contacts that were sent, `enriched` for
+    contacts whose enrichment can be reused. A checkpoint is ignored when
+    the sheet row now holds a different email.
+    """
+    for row in rows:
+        row["resumed_record"] = None
+        row["enriched"] = None
+        state = checkpoints.get(row["row_index"])
+        if state is not None and state["email"] == row["email"]:
+            if state["status"] == "sent" and state["record"]:
+                row["resumed_record"] = state["record"]
+            elif state["enrichment"]:
+                row["enriched"] = state["enrichment"]
+        yield row
+
+def write_contact_list(owner, path):
+    """
+    Export the user's merged contact list, grouped by company, to an xlsx
+    file. Returns the number of contacts in it.
+    """
+    records = get_contact_list(owner)
+    contacts = pd.DataFrame.from_records(records, columns=OUTPUT_COLUMNS)
+    write_xlsx(path, OUTPUT_COLUMNS, [group_by_company(contacts, OUTPUT_COLUMNS)])
+    return len(records)
@@ -0,0 +1,92 @@
+import pandas as pd
+
+REQUIRED_COLUMNS = ['first_name', 'last_name', 'email', 'company', 'role', 'education', 'location']
+
+# Columns of the updated contact list, in order
+OUTPUT_COLUMNS = [
+    "company", "account_owner", "status", "industry", "HQ", "FTEs", "description",
+    "first_name", "last_name", "email", "role", "education", "location", "notes", "added", "last_contact"
+]
+
+DEFAULT_SCHOOL = "École polytechnique"
+SCHOOLS = {"hec paris": "HEC Paris"}  # Lowercased education value -> school named in the email
+
+# Output columns that are the same for every contact of a run
+RECORD_PLACEHOLDERS = {
+    "account_owner": "",
+    "status": "Contacted",
+    "industry": "",
+    "notes": "",
+    "added": ""
+}
+
+def get_subject(language, school):
+    return f"{school} * {'Projet de Structuration de Données' if language == 'French' else 'Structured Data Project'}"
+
+def text_value(value):
+    """A sheet cell as placeholder text: empty cells (NaN, None) become ""."""
+    if value is None or pd.isna(value):
+        return ""
+    return str(value)
+
+def render_contact(row, enriched, template_fr, template_en):
+    """Render the subject and body of a contact's email."""
+    civility = enriched["civility"]
+    is_french = enriched["language"] == "French"
+
+    placeholders = {
+        "CIVILITÉ": civility,
+        "CIVILITY": civility,
+        "LAST_NAME": text_value(row["last_name"]),
+        "COMPANY": text_value(row["company"]),
+        "SCHOOL": row["school"]
+    }
+
+    template = template_fr if is_french else template_en
+    return {
+        "enriched": enriched,
+        "subject": row["subject_fr"] if is_french else row["subject_en"],
+        "body": template.render(placeholders)
+    }
+
+def prepare_contact_frame(df, seen_emails, today_str, find_contacted=None):
+    """
+    Prepare one chunk of the sheet on whole columns: normalise emails, flag
+    duplicates (within the chunk and against `seen_emails`, which is
+    updated) and people contacted before, and compute the school, both
+    subjects and the placeholder output columns. `find_contacted` takes the
+    chunk's new addresses and returns those already in the sent ledger.
+    Returns one dict per row, in sheet order.
+    """
+    contacts = df[REQUIRED_COLUMNS].copy()
+    contacts["row_index"] = df.index  # Position in the sheet, continued across chunks
+
+    contacts["email"] = contacts["email"].fillna("").astype(str).str.strip()
+    email_key = contacts["email"].str.lower()
+    duplicate = email_key.duplicated() | email_key.isin(seen_emails)
+    contacts["duplicate"] = duplicate
+    seen_emails.update(email_key[~duplicate])
+
+    contacts["contacted"] = False
+    if find_contacted is not None:
+        candidates = email_key[~duplicate & (email_key != "")]
+        if not candidates.empty:
+            contacts["contacted"] = email_key.isin(find_contacted(candidates.tolist())) & ~duplicate
+
+    education = contacts["education"].fillna("").astype(str).str.strip().str.lower()
+    contacts["school"] = education.map(SCHOOLS).fillna(DEFAULT_SCHOOL)
+    schools = [DEFAULT_SCHOOL, *SCHOOLS.values()]
+    contacts["subject_fr"] = contacts["school"].map({school: get_subject("French", school) for school in schools})
+    contacts["subject_en"] = contacts["school"].map({school: get_subject("English", school) for school in schools})
+
+    for column, value in RECORD_PLACEHOLDERS.items():
+        contacts[column] = value
+    contacts["last_contact"] = today_str
+
+    return contacts.to_dict('records')
+
+def iter_prepared_contacts(chunks, today_str, find_contacted=None):
+    """Prepare sheet chunks as they arrive and yield their contacts in order."""
+    seen_emails = set()
+    for chunk in chunks:
+        yield from prepare_contact_frame(chunk, seen_emails, today_str, find_contacted)
@@ -1,14 +1,16 @@
-import pandas as pd
 import os
-import requests
+import itertools
 from datetime import datetime
 import sys
-import re
-import io
 import platform
 
 # === Load environment and paths ===
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+BACKEND_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(BACKEND_ROOT)  # Also run as a standalone script
+
+from scripts.sheet_fetch import iter_sheet_chunks, read_sheet_head, to_json_records
+from scripts.excel_output import write_xlsx
 
 def get_downloads_path():
     """Get the appropriate downloads path based on the environment."""
@@ -25,18 +27,6 @@ DOWNLOADS_PATH = get_downloads_path()
 
 COLUMNS_TO_KEEP = ["first_name", "last_name", "email", "company", "role", "education", "location"]
 
-def extract_sheet_id(url):
-    # Extract sheet ID from Google Sheets URL
-    pattern = r'/d/([a-zA-Z0-9-_]+)'
-    match = re.search(pattern, url)
-    if not match:
-        raise ValueError("Invalid Google Sheet URL")
-    return match.group(1)
-
-def get_sheet_csv_url(sheet_url):
-    sheet_id = extract_sheet_id(sheet_url)
-    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-
 def download_and_clean_sheet(sheet_url=None, confirm=True):
     if not sheet_url:
         raise ValueError("Sheet URL is required")
@@ -48,31 +38,26 @@ def download_and_clean_sheet(sheet_url=None, confirm=True):
             return
 
     print("⏏︎ Downloading Google Sheet...")
-    csv_url = get_sheet_csv_url(sheet_url)
-    response = requests.get(csv_url, timeout=10)
-    response.raise_for_status()
+    chunks = iter_sheet_chunks(sheet_url)
+    first = next(chunks, None)
+    columns = [] if first is None else list(first.columns)
 
-    df = pd.read_csv(io.BytesIO(response.content), encoding="utf-8")
-
-    missing = [col for col in COLUMNS_TO_KEEP if col not in df.columns]
+    missing = [col for col in COLUMNS_TO_KEEP if col not in columns]
     if missing:
         print(f"❌ Missing columns in sheet: {missing}")
         return
 
     # Ensure the directory exists
     os.makedirs(os.path.dirname(DOWNLOADS_PATH), exist_ok=True)
-    
-    df[COLUMNS_TO_KEEP].to_excel(DOWNLOADS_PATH, index=False, engine='openpyxl')
-    print(f"✓ Saved contact list to: {DOWNLOADS_PATH}")
+
+    # Rows are written as chunks arrive, so the sheet is never fully in memory
+    rows = write_xlsx(DOWNLOADS_PATH, COLUMNS_TO_KEEP, itertools.chain([first], chunks))
+    print(f"✓ Saved {rows} contacts to: {DOWNLOADS_PATH}")
 
 def get_sheet_preview(sheet_url, rows=5):
-    """Get a preview of the sheet data"""
+    """Get a preview of the sheet data, with NaN values as None"""
     try:
-        csv_url = get_sheet_csv_url(sheet_url)
-        response = requests.get(csv_url, timeout=10)
-        response.raise_for_status()
-        df = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
-        return df.head(rows).to_dict('records')
+        return to_json_records(read_sheet_head(sheet_url, rows))
     except Exception as e:
         print(f"Error getting sheet preview: {e}")
         return []
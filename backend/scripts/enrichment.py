@@ -0,0 +1,403 @@
+import os
+import re
+import json
+import threading
+from concurrent.futures import Future
+import pandas as pd
+from db.config_db import get_company_enrichment, save_company_enrichment
+
+# === COMPANY CACHE SETTINGS ===
+COMPANY_CACHE_TTL_DAYS = int(os.getenv("COMPANY_CACHE_TTL_DAYS", 30))
+
+COMPANY_FIELDS = ["hq", "ftes", "description"]
+
+DEFAULT_ENRICHMENT = {
+    "language": "English",
+    "civility": "Mr",
+    "hq": "",
+    "ftes": "",
+    "description": ""
+}
+
+CONTACT_TASKS = """1. Determine the preferred language ("French" or "English") according to the following logic:
+   - If the location mentions France or a French-speaking city (e.g., Paris, Lyon, Marseille, Geneva, Brussels), choose "French".
+   - If the location is in an English-speaking country (e.g., UK, USA, Canada except Quebec), choose "English".
+   - If you cannot determine from the location, try to guess from the first name (Luc, Pierre, Claire → commonly French; John, James, Emma → commonly English).
+   - If still uncertain, default to "English" for safety.
+
+2. Assign an appropriate civility:
+   - If French: "Monsieur" or "Madame" (based on first name gender).
+   - If English: "Mr" or "Ms".
+"""
+
+COMPANY_TASK = """
+3. Enrich with company HQ, FTEs, and a short description - in English.
+   - HQ: "Paris" for BNP Paribas, "Boston" for BCG, "Paris" for TotalEnergies, etc.
+   - FTEs: "~100k" for BNP Paribas, "~600" for Alan, etc.
+   - Description: A short description resuming the company's activity - be concise and precise, for example: "Independent Equity & Credit Research", "Corporate & Investment Bank (Equity Research)", "Independent Equity Research", etc.
+   Pay attention that those information are the same if the company appears multiple times.
+   - If you cannot find the information, return "".
+"""
+
+def build_prompt(contact, include_company=True):
+    """Build the enrichment prompt for a single contact."""
+    fields = ["language", "civility"] + (COMPANY_FIELDS if include_company else [])
+    response_format = ",\n".join(f'  "{field}": "..."' for field in fields)
+    return f"""
+You are helping personalize professional emails for business executives. Here is the contact's information:
+
+First Name: {contact['first_name']}
+Last Name: {contact['last_name']}
+Role: {contact['role']}
+Company: {contact['company']}
+Location: {contact['location']}
+
+Tasks:
+{CONTACT_TASKS}{COMPANY_TASK if include_company else ""}
+Respond ONLY in JSON format like:
+{{
+{response_format}
+}}
+"""
+
+def parse_json_response(raw_text):
+    """Strip markdown fences from a model response and parse it as JSON."""
+    cleaned = re.sub(r"^```(?:json)?", "", raw_text.strip())
+    cleaned = re.sub(r"```$", "", cleaned.strip())
+    return json.loads(cleaned)
+
+def normalize_enrichment(result):
+    """Fill missing fields and coerce language and civility to known values."""
+    for field in DEFAULT_ENRICHMENT:
+        if field not in result:
+            result[field] = ""
+
+    # Ensure language is either "French" or "English"
+    if result["language"] not in ["French", "English"]:
+        result["language"] = "English"
+
+    # Ensure civility is appropriate for the language
+    if result["language"] == "French":
+        if result["civility"] not in ["Monsieur", "Madame"]:
+            result["civility"] = "Monsieur"
+    else:
+        if result["civility"] not in ["Mr", "Ms"]:
+            result["civility"] = "Mr"
+
+    return result
+
+def request_enrichment(contact, client, company=None):
+    """
+    Ask the model to enrich one contact. When `company` details are given,
+    the company task is left out of the prompt and those details are used.
+    Raises on API or parsing errors.
+    """
+    response = client.ChatCompletion.create(
+        model="gpt-4",
+        messages=[{"role": "user", "content": build_prompt(contact, include_company=company is None)}],
+        temperature=0.5,
+        max_tokens=500
+    )
+    result = parse_json_response(response.choices[0].message.content)
+    if company is not None:
+        result.update(company)
+    return normalize_enrichment(result)
+
+def company_key(company):
+    """Normalise a company name into a cache key."""
+    if company is None or pd.isna(company):
+        return ""
+    return " ".join(str(company).split()).lower()
+
+class CompanyCache:
+    """
+    Company enrichment shared by all contacts of a run and persisted in the
+    company_enrichments table. Concurrent lookups for the same company wait
+    on a single load instead of each asking the model. Companies looked up
+    and not found in the table are remembered, so they cost one query per
+    run rather than one per batch.
+    """
+
+    def __init__(self, ttl_days=COMPANY_CACHE_TTL_DAYS, refresh=False):
+        self.ttl_days = ttl_days
+        self.refresh = refresh  # Ignore stored entries and overwrite them
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._absent = set()  # Keys with no stored details
+
+    def peek(self, company):
+        """Return details already known for `company` without loading them."""
+        key = company_key(company)
+        if not key:
+            return None
+
+        with self._lock:
+            future = self._entries.get(key)
+        if future is not None:
+            if future.done() and future.exception() is None:
+                with self._lock:
+                    self.hits += 1
+                return future.result()
+            return None
+
+        details = self._lookup(key)
+        if details:
+            self._resolve(key, details)
+            with self._lock:
+                self.hits += 1
+        return details
+
+    def _lookup(self, key):
+        """Stored details for `key`, querying the table at most once per run."""
+        with self._lock:
+            if self.refresh or key in self._absent:
+                return None
+        details = get_company_enrichment(key, self.ttl_days)
+        if not details:
+            with self._lock:
+                self._absent.add(key)
+        return details
+
+    def _save(self, key, details):
+        try:
+            save_company_enrichment(key, details)
+        except Exception as e:
+            # The contact is already enriched, only the cache entry is lost
+            print(f"Error saving enrichment for company {key}: {str(e)}")
+
+    def put(self, company, result):
+        """Record company details that were enriched outside of get()."""
+        key = company_key(company)
+        details = {field: result.get(field, "") for field in COMPANY_FIELDS}
+        if not key or not any(details.values()):
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self.misses += 1
+        self._save(key, details)
+        self._resolve(key, details)
+
+    def _resolve(self, key, details):
+        with self._lock:
+            self._absent.discard(key)
+            if key not in self._entries:
+                future = Future()
+                future.set_result(details)
+                self._entries[key] = future
+
+    def get(self, company, load):
+        """Return cached details for `company`, calling `load()` on a miss."""
+        key = company_key(company)
+        if not key:
+            return load()
+
+        with self._lock:
+            future = self._entries.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._entries[key] = future
+            else:
+                self.hits += 1
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            details = self._lookup(key)
+            if details:
+                with self._lock:
+                    self.hits += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                details = {field: load().get(field, "") for field in COMPANY_FIELDS}
+                if any(details.values()):
+                    self._save(key, details)
+            with self._lock:
+                self._absent.discard(key)
+            future.set_result(details)
+            return details
+        except Exception as e:
+            # Let the next lookup for this company retry
+            with self._lock:
+                self._entries.pop(key, None)
+            future.set_exception(e)
+            raise
+
+def is_auth_error(error):
+    """Whether an OpenAI error means the API key was rejected."""
+    return getattr(error, "http_status", None) == 401 or type(error).__name__ == "AuthenticationError"
+
+class EnrichmentAuthError(Exception):
+    """OpenAI rejected the API key, so no other contact of the run can be enriched."""
+
+def enrich_contact(contact, client, company_cache=None, stats=None):
+    """
+    Enrich one contact, falling back to default values when the request
+    fails. Raises EnrichmentAuthError when the API key is rejected.
+    """
+    try:
+        if company_cache is None:
+            return request_enrichment(contact, client)
+
+        # The first contact of a company is enriched in full and seeds the
+        # cache; the others only ask for language and civility.
+        loaded = {}
+
+        def load():
+            loaded.update(request_enrichment(contact, client))
+            return loaded
+
+        company = company_cache.get(contact['company'], load)
+        if loaded:
+            return loaded
+        return request_enrichment(contact, client, company=company)
+    except Exception as e:
+        print(f"Error enriching contact: {str(e)}")
+        if is_auth_error(e):
+            if stats is not None:
+                stats.auth_failed = True
+            raise EnrichmentAuthError(str(e)) from e
+        # Return default values if enrichment fails
+        return dict(DEFAULT_ENRICHMENT)
+
+class EnrichmentStats:
+    """
+    Request and token savings from batched enrichment, shared across workers.
+    `auth_failed` is set when OpenAI rejects the API key during the run.
+    """
+
+    def __init__(self):
+        self.contacts = 0
+        self.requests = 0
+        self.requests_saved = 0
+        self.prompt_tokens_saved = 0
+        self.fallbacks = 0
+        self.auth_failed = False
+        self._lock = threading.Lock()
+
+    def record_batch(self, contacts, requests_saved=0, prompt_tokens_saved=0, fallbacks=0):
+        with self._lock:
+            self.contacts += contacts
+            self.requests += 1
+            self.requests_saved += requests_saved
+            self.prompt_tokens_saved += prompt_tokens_saved
+            self.fallbacks += fallbacks
+
+def build_batch_prompt(contacts, known_companies):
+    """Build one prompt for several contacts, keyed by their position in the batch."""
+    lines = []
+    for row_id, contact in enumerate(contacts):
+        lines.append(json.dumps({
+            "row": row_id,
+            "first_name": str(contact['first_name']),
+            "last_name": str(contact['last_name']),
+            "role": str(contact['role']),
+            "company": str(contact['company']),
+            "location": str(contact['location']),
+            "company_known": row_id in known_companies
+        }, ensure_ascii=False))
+    contact_lines = "\n".join(lines)
+    return f"""
+You are helping personalize professional emails for business executives. Here are the contacts, one JSON object per line, each with a "row" id:
+
+{contact_lines}
+
+Tasks, for each contact:
+{CONTACT_TASKS}{COMPANY_TASK}   Skip task 3 for contacts with "company_known": true and return "" for those fields.
+
+Respond ONLY with a JSON array holding one object per contact, like:
+[
+  {{"row": 0, "language": "...", "civility": "...", "hq": "...", "ftes": "...", "description": "..."}}
+]
+"""
+
+def request_batch_enrichment(contacts, client, known_companies, stats=None):
+    """
+    Enrich several contacts with a single request. Returns a dict mapping
+    row id to the normalised result; rows the model left out or answered
+    malformed are missing from it. Raises if the response is not a JSON array.
+    """
+    prompt = build_batch_prompt(contacts, known_companies)
+    response = client.ChatCompletion.create(
+        model="gpt-4",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.5,
+        max_tokens=100 + 150 * len(contacts)
+    )
+    results = parse_json_response(response.choices[0].message.content)
+    if not isinstance(results, list):
+        raise ValueError("Batched enrichment response is not a JSON array")
+
+    enriched = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        try:
+            row_id = int(result.pop("row"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= row_id < len(contacts):
+            if row_id in known_companies:
+                result.update(known_companies[row_id])
+            enriched[row_id] = normalize_enrichment(result)
+
+    if stats is not None:
+        # Estimate what the single-contact prompts would have cost from the
+        # batch's own tokens-per-character ratio
+        prompt_tokens = getattr(getattr(response, "usage", None), "prompt_tokens", 0) or 0
+        single_chars = sum(
+            len(build_prompt(contacts[row_id], include_company=row_id not in known_companies))
+            for row_id in enriched
+        )
+        single_tokens = prompt_tokens * single_chars // max(len(prompt), 1)
+        stats.record_batch(
+            len(contacts),
+            requests_saved=max(len(enriched) - 1, 0),
+            prompt_tokens_saved=max(single_tokens - prompt_tokens, 0),
+            fallbacks=len(contacts) - len(enriched)
+        )
+    return enriched
+
+def enrich_contacts(contacts, client, company_cache=None, stats=None):
+    """
+    Enrich a batch of contacts with one request, falling back to one
+    request per contact for anything the batched response got wrong.
+    Raises EnrichmentAuthError when the API key is rejected.
+    """
+    if len(contacts) == 1:
+        return [enrich_contact(contacts[0], client, company_cache, stats)]
+
+    known_companies = {}
+    if company_cache is not None:
+        for row_id, contact in enumerate(contacts):
+            details = company_cache.peek(contact['company'])
+            if details:
+                known_companies[row_id] = details
+
+    try:
+        enriched = request_batch_enrichment(contacts, client, known_companies, stats)
+    except Exception as e:
+        if is_auth_error(e):
+            if stats is not None:
+                stats.auth_failed = True
+            raise EnrichmentAuthError(str(e)) from e
+        print(f"Batched enrichment failed, falling back to single requests: {str(e)}")
+        enriched = {}
+        if stats is not None:
+            stats.record_batch(len(contacts), fallbacks=len(contacts))
+
+    results = []
+    for row_id, contact in enumerate(contacts):
+        if row_id in enriched:
+            result = enriched[row_id]
+            if company_cache is not None and row_id not in known_companies:
+                company_cache.put(contact['company'], result)
+        else:
+            result = enrich_contact(contact, client, company_cache, stats)
+        results.append(result)
+    return results
@@ -0,0 +1,80 @@
+import pandas as pd
+import xlsxwriter
+
+# Cells are written as plain text: a contact field starting with "=" must
+# not become a formula, and URLs don't need to become hyperlinks
+XLSX_OPTIONS = {
+    "constant_memory": True,
+    "strings_to_formulas": False,
+    "strings_to_urls": False,
+}
+# Companies with more distinct values than this in a column are joined per group
+MAX_JOIN_LAYERS = 8
+
+def join_values(keys, values):
+    """
+    Series indexed by key holding the distinct non-empty values of that key,
+    in order of appearance, joined by newlines.
+    """
+    pairs = pd.DataFrame({"key": keys, "value": values}).dropna()
+    pairs["value"] = pairs["value"].astype(str)
+    pairs = pairs.drop_duplicates()
+    pairs["position"] = pairs.groupby("key", sort=False).cumcount()
+
+    # Keys with many values are joined one group at a time; there are few of them
+    counts = pairs.groupby("key", sort=False)["position"].transform("size")
+    deep = counts > MAX_JOIN_LAYERS
+    joined_deep = pairs[deep].groupby("key", sort=False)["value"].agg("\n".join)
+
+    # The rest are appended one position at a time: the first value of every
+    # key, then "\n" and the second value where there is one, and so on
+    shallow = pairs[~deep]
+    first = shallow[shallow["position"] == 0]
+    joined = pd.Series(first["value"].to_numpy(), index=first["key"].to_numpy(), dtype=object)
+    for position in range(1, MAX_JOIN_LAYERS):
+        layer = shallow[shallow["position"] == position]
+        if layer.empty:
+            break
+        keys_at = layer["key"].to_numpy()
+        joined.loc[keys_at] = joined.loc[keys_at].to_numpy() + "\n" + layer["value"].to_numpy()
+    return pd.concat([joined, joined_deep])
+
+def group_by_company(df, columns, key="company"):
+    """
+    One row per company (sorted, like groupby), where each column holds the
+    distinct non-empty values of that company's contacts in order of
+    appearance, joined by newlines. Rows without a company are dropped.
+    Columns are grouped one at a time to keep memory close to the input's.
+    """
+    companies = pd.Index(df[key].dropna().unique()).sort_values()
+    grouped = pd.DataFrame({key: companies})
+    for column in columns:
+        if column != key:
+            grouped[column] = join_values(df[key], df[column]).reindex(companies).fillna("").to_numpy()
+    return grouped[columns]
+
+def cell_value(value):
+    """Blank cells for missing values (None, NaN, NaT, NA), which xlsxwriter can't write."""
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return None
+    return value
+
+def write_xlsx(path, columns, frames):
+    """
+    Write DataFrames with `columns` to an xlsx file, one after another, in
+    xlsxwriter's constant memory mode: each row is flushed to disk once the
+    next one starts, so memory doesn't grow with the number of rows.
+    Returns the number of rows written.
+    """
+    workbook = xlsxwriter.Workbook(path, XLSX_OPTIONS)
+    try:
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, columns, workbook.add_format({"bold": True}))
+        row_number = 0
+        for frame in frames:
+            for values in frame[columns].itertuples(index=False, name=None):
+                row_number += 1
+                worksheet.write_row(row_number, 0, [cell_value(value) for value in values])
+    finally:
+        workbook.close()
+    return row_number
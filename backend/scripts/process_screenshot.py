@@ -18,6 +18,7 @@ load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
 
 # Import after path setup
 from db.config_db import get_user_config
+from scripts.upload_dedup import UploadFingerprint
 
 def notify(title, message):
     """Send a macOS notification."""
@@ -88,6 +89,12 @@ def process_file(file_path, email):
                 print(f"Error: Not a valid PNG file: {filename}")
                 return False
 
+            fingerprint = UploadFingerprint(email, file_content, filename)
+            duplicate = fingerprint.find_duplicate()
+            if duplicate is not None:
+                print(f"↷ Skipped {filename}, same screenshot as {duplicate['file_name']}")
+                return True
+
             files = {"file": (filename, file_content, "image/png")}
             headers = {"Api-Key": api_key}
             
@@ -96,6 +103,7 @@ def process_file(file_path, email):
 
         if response.status_code == 200:
             print(f"✓ Successfully processed: {filename}")
+            fingerprint.remember()
             try:
                 os.remove(file_path)
                 print(f"✓ Deleted local file: {filename}")
@@ -129,12 +137,21 @@ def process_screenshot(file_path, email):
         api_key, api_endpoint = get_api_config(email)
         
         with open(file_path, "rb") as f:
-            files = {"file": f}
-            headers = {"Api-Key": api_key}
-            response = requests.post(api_endpoint, headers=headers, files=files)
+            file_content = f.read()
+
+        fingerprint = UploadFingerprint(email, file_content, os.path.basename(file_path))
+        duplicate = fingerprint.find_duplicate()
+        if duplicate is not None:
+            print(f"↷ Skipped {os.path.basename(file_path)}, same screenshot as {duplicate['file_name']}")
+            return True
+
+        files = {"file": (os.path.basename(file_path), file_content)}
+        headers = {"Api-Key": api_key}
+        response = requests.post(api_endpoint, headers=headers, files=files)
             
         if response.status_code == 200:
             print(f"✓ Successfully processed: {os.path.basename(file_path)}")
+            fingerprint.remember()
             return True
         else:
             print(f"❌ Failed to process {os.path.basename(file_path)}: {response.status_code} - {response.text}")
@@ -1,19 +1,34 @@
 import os
-import re
 import sys
 import json
 import smtplib
-import time
 import pandas as pd
-import requests
 from datetime import datetime
 from dotenv import load_dotenv
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import openai
-import io
 import platform
-from db.config_db import get_user_templates, get_user_config
+import queue
+import itertools
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from db.config_db import (
+    get_user_template_versions, get_template_content, get_user_config, get_smtp_accounts, save_smtp_method,
+    save_openai_key_status, invalidate_openai_key_status, encryption,
+    record_sent_email, get_contacted_recipients,
+    create_campaign, get_campaign, claim_campaign, update_campaign_status, get_campaign_checkpoints,
+    RESUMABLE_CAMPAIGN_STATUSES
+)
+from scripts.enrichment import CompanyCache, EnrichmentAuthError, EnrichmentStats, enrich_contacts
+from scripts.smtp_pool import SmtpPool
+from scripts.campaigns import CampaignCheckpointer, apply_checkpoints, write_contact_list
+from scripts.contacts import OUTPUT_COLUMNS, REQUIRED_COLUMNS, iter_prepared_contacts, render_contact
+from scripts.template_engine import template_cache
+from scripts.sheet_fetch import SentContactSpool, iter_sheet_chunks, read_sheet
+from scripts.excel_output import group_by_company, write_xlsx
 
 # === PATH SETUP ===
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -34,7 +49,13 @@ def get_downloads_path():
 
 # === DATA PATHS ===
 UPDATED_LIST_PATH = get_downloads_path()
-SENT_EMAILS_PATH = os.path.expanduser("~/Downloads/sent_emails.json")
+
+# === ENRICHMENT POOL ===
+DEFAULT_ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", 4))
+MAX_ENRICHMENT_WORKERS = 16
+DEFAULT_ENRICHMENT_BATCH_SIZE = int(os.getenv("ENRICHMENT_BATCH_SIZE", 1))
+MAX_ENRICHMENT_BATCH_SIZE = 20
+ENRICHMENT_LOOKAHEAD = 2  # Rows queued ahead of the sender per worker
 
 def get_openai_client(email):
     """Get OpenAI client with API key from user settings."""
@@ -57,25 +78,44 @@ def get_openai_client(email):
         if config.get('openai_api_base'):
             openai.api_base = config['openai_api_base']
         
-        # Test the API key with a simple request using chat completions
-        try:
-            openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": "test"}],
-                max_tokens=1
-            )
-        except Exception as e:
-            print(f"OpenAI API test failed: {str(e)}")
-            raise ValueError(f"Invalid OpenAI API key: {str(e)}")
+        # Reuse the validation done when the key was saved, as long as the
+        # key hasn't changed and no real call has been rejected since
+        valid, error = check_openai_key(email, config)
+        if not valid:
+            print(f"OpenAI API test failed: {error}")
+            raise ValueError(f"Invalid OpenAI API key: {error}")
         
         return openai
     except Exception as e:
         print(f"Error initializing OpenAI client: {str(e)}")
         raise ValueError(f"Failed to initialize OpenAI client: {str(e)}")
 
+def validate_openai_key(api_key, api_base=None):
+    """Check an OpenAI API key with a free models request. Returns (valid, error)."""
+    try:
+        openai.Model.list(api_key=api_key, api_base=api_base)
+        return True, None
+    except Exception as e:
+        print(f"OpenAI API key validation failed: {str(e)}")
+        return False, str(e)
+
+def check_openai_key(email, config):
+    """Validate the user's OpenAI key unless that key already passed. Returns (valid, error)."""
+    api_key = config['openai_api_key']
+    fingerprint = encryption.fingerprint(api_key)
+    if config.get('openai_key_fingerprint') == fingerprint and config.get('openai_key_valid'):
+        return True, None
+    valid, error = validate_openai_key(api_key, config.get('openai_api_base'))
+    save_openai_key_status(email, fingerprint, valid)
+    return valid, error
+
 def get_templates(email):
-    """Get templates from the database for the given user."""
-    templates = get_user_templates(email)
+    """
+    Get the user's compiled French and English templates. Only the template
+    versions are read from the database; content is loaded and compiled
+    again only when a template changed since the last run.
+    """
+    templates = get_user_template_versions(email)
     if not templates:
         raise ValueError("No templates found for user")
     
@@ -84,10 +124,19 @@ def get_templates(email):
     template_en = None
     
     for template in templates:
-        if template.get("name", "").lower() == "template_fr":
-            template_fr = template.get("content", "")
-        elif template.get("name", "").lower() == "template_en":
-            template_en = template.get("content", "")
+        name = (template.get("name") or "").lower()
+        if name not in ("template_fr", "template_en"):
+            continue
+        compiled = template_cache.get(
+            email, template["id"], template["updated_at"],
+            lambda template_id=template["id"]: get_template_content(template_id) or ""
+        )
+        if not compiled.content:
+            continue
+        if name == "template_fr":
+            template_fr = compiled
+        else:
+            template_en = compiled
     
     if not template_fr or not template_en:
         raise ValueError("Both French and English templates must be configured")
@@ -101,7 +150,32 @@ def get_smtp_config(email):
     if not config:
         print("No configuration found for user")
         raise ValueError("No configuration found for user")
-    
+    return resolve_smtp_config(config, owner=email)
+
+def get_smtp_configs(email):
+    """
+    Get the SMTP configuration of every account a campaign can send from:
+    the user's main account followed by their enabled extra accounts.
+    Returns the configurations and the errors of accounts that were skipped.
+    """
+    smtp_configs = [get_smtp_config(email)]
+    errors = []
+    for account in get_smtp_accounts(email):
+        if not account.get('enabled', True):
+            continue
+        try:
+            smtp_configs.append(resolve_smtp_config(account, owner=email, account_id=account['id']))
+        except ValueError as e:
+            print(f"Skipping SMTP account {account.get('smtp_user')}: {str(e)}")
+            errors.append(f"{account.get('smtp_user')}: {str(e)}")
+    return smtp_configs, errors
+
+def resolve_smtp_config(config, owner, account_id=None, refresh=False):
+    """
+    Validate an account's SMTP settings and return its connection settings.
+    The connection method found by probing is stored with the account and
+    reused until `refresh` is set or a real connection fails.
+    """
     required_fields = ['smtp_user', 'smtp_pass', 'smtp_server', 'smtp_port']
     missing_fields = [field for field in required_fields if not config.get(field)]
     
@@ -148,170 +222,220 @@ def get_smtp_config(email):
     }
     print(f"SMTP config: {masked_config}")
     
-    # Try different SMTP connection methods
+    method = config.get('smtp_method')
+    port = config.get('smtp_method_port')
+    method_cached = bool(method and port) and not refresh
+    if method_cached:
+        print(f"Using cached SMTP connection method: {method} on port {port}")
+    else:
+        method, port = discover_smtp_method(smtp_server, smtp_port, smtp_user, smtp_pass)
+        save_smtp_method(owner, method, port, account_id=account_id)
+
+    return {
+        'username': smtp_user,
+        'password': smtp_pass,
+        'server': smtp_server,
+        'port': port,
+        'use_ssl': method == "ssl",
+        'method_cached': method_cached,
+        'configured_port': smtp_port,
+        'owner': owner,
+        'account_id': account_id,
+        'send_interval': config.get('smtp_send_interval'),
+        'send_burst': config.get('smtp_send_burst'),
+        'daily_limit': config.get('smtp_daily_limit')
+    }
+
+def discover_smtp_method(smtp_server, smtp_port, smtp_user, smtp_pass):
+    """Try each SMTP connection method in turn and return the first (method, port) that logs in."""
     connection_methods = [
         # Try SSL/TLS from the start (port 465)
-        lambda: smtplib.SMTP_SSL(smtp_server, 465),
-        # Try STARTTLS (port 587)
-        lambda: smtplib.SMTP(smtp_server, smtp_port),
+        ("ssl", 465),
+        # Try STARTTLS on the configured port
+        ("starttls", smtp_port),
         # Try default port with STARTTLS
-        lambda: smtplib.SMTP(smtp_server, 587)
+        ("starttls", 587)
     ]
-    
+
     last_error = None
-    for create_connection in connection_methods:
+    for method, port in dict.fromkeys(connection_methods):
         try:
-            print(f"Trying SMTP connection method: {create_connection.__name__}")
-            with create_connection() as server:
-                if isinstance(server, smtplib.SMTP):
+            print(f"Trying SMTP connection method: {method} on port {port}")
+            connection_class = smtplib.SMTP_SSL if method == "ssl" else smtplib.SMTP
+            with connection_class(smtp_server, port) as server:
+                if method == "starttls":
                     print("Starting TLS connection...")
                     server.starttls()
-                
+
                 print(f"Attempting login with username: {smtp_user}")
                 server.login(smtp_user, smtp_pass)
                 print("SMTP connection test successful")
-                
-                # If we get here, the connection worked
-                return {
-                    'username': smtp_user,
-                    'password': smtp_pass,
-                    'server': smtp_server,
-                    'port': smtp_port,
-                    'use_ssl': isinstance(server, smtplib.SMTP_SSL)
-                }
+                return method, port
         except Exception as e:
             print(f"SMTP connection attempt failed: {str(e)}")
             last_error = e
             continue
-    
+
     # If we get here, all connection attempts failed
     error_msg = f"All SMTP connection attempts failed. Last error: {str(last_error)}"
     print(error_msg)
     raise ValueError(error_msg)
 
-def load_sent_emails():
-    if os.path.exists(SENT_EMAILS_PATH):
+def rediscover_smtp_config(smtp_config):
+    """Probe an account again after its cached connection method stopped working."""
+    method, port = discover_smtp_method(
+        smtp_config['server'], smtp_config['configured_port'],
+        smtp_config['username'], smtp_config['password']
+    )
+    save_smtp_method(smtp_config['owner'], method, port, account_id=smtp_config['account_id'])
+    return {**smtp_config, 'port': port, 'use_ssl': method == "ssl", 'method_cached': False}
+
+def get_enrichment_settings(email):
+    """Get the user's enrichment worker pool size and batch size."""
+    config = get_user_config(email) or {}
+
+    def setting(field, default, maximum):
         try:
-            with open(SENT_EMAILS_PATH, 'r') as f:
-                return set(json.load(f))
-        except:
-            return set()
-    return set()
-
-def save_sent_email(email):
-    sent_emails = load_sent_emails()
-    sent_emails.add(email)
-    with open(SENT_EMAILS_PATH, 'w') as f:
-        json.dump(list(sent_emails), f)
-
-def extract_sheet_id(url):
-    pattern = r'/d/([a-zA-Z0-9-_]+)'
-    match = re.search(pattern, url)
-    if not match:
-        raise ValueError("Invalid Google Sheet URL")
-    return match.group(1)
-
-def get_sheet_csv_url(sheet_url):
-    sheet_id = extract_sheet_id(sheet_url)
-    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-
-def get_sheet_data(sheet_url):
-    csv_url = get_sheet_csv_url(sheet_url)
-    response = requests.get(csv_url, timeout=10)
-    response.raise_for_status()
-    return pd.read_csv(io.BytesIO(response.content), encoding="utf-8")
-
-def enrich_contact(contact, client):
-    prompt = f"""
-You are helping personalize professional emails for business executives. Here is the contact's information:
-
-First Name: {contact['first_name']}
-Last Name: {contact['last_name']}
-Role: {contact['role']}
-Company: {contact['company']}
-Location: {contact['location']}
-
-Tasks:
-1. Determine the preferred language ("French" or "English") according to the following logic:
-   - If the location mentions France or a French-speaking city (e.g., Paris, Lyon, Marseille, Geneva, Brussels), choose "French".
-   - If the location is in an English-speaking country (e.g., UK, USA, Canada except Quebec), choose "English".
-   - If you cannot determine from the location, try to guess from the first name (Luc, Pierre, Claire → commonly French; John, James, Emma → commonly English).
-   - If still uncertain, default to "English" for safety.
-
-2. Assign an appropriate civility:
-   - If French: "Monsieur" or "Madame" (based on first name gender).
-   - If English: "Mr" or "Ms".
-
-3. Enrich with company HQ, FTEs, and a short description - in English.
-   - HQ: "Paris" for BNP Paribas, "Boston" for BCG, "Paris" for TotalEnergies, etc.
-   - FTEs: "~100k" for BNP Paribas, "~600" for Alan, etc.
-   - Description: A short description resuming the company's activity - be concise and precise, for example: "Independent Equity & Credit Research", "Corporate & Investment Bank (Equity Research)", "Independent Equity Research", etc.
-   Pay attention that those information are the same if the company appears multiple times.
-   - If you cannot find the information, return "".
-
-Respond ONLY in JSON format like:
-{{
-  "language": "...",
-  "civility": "...",
-  "hq": "...",
-  "ftes": "...",
-  "description": "..."
-}}
-"""
+            value = int(config.get(field) or default)
+        except (TypeError, ValueError):
+            value = default
+        return max(1, min(value, maximum))
+
+    workers = setting('enrichment_workers', DEFAULT_ENRICHMENT_WORKERS, MAX_ENRICHMENT_WORKERS)
+    batch_size = setting('enrichment_batch_size', DEFAULT_ENRICHMENT_BATCH_SIZE, MAX_ENRICHMENT_BATCH_SIZE)
+    return workers, batch_size
+
+def prepare_contacts(rows, openai_client, template_fr, template_en, company_cache=None, stats=None):
+    """Enrich a batch of contacts and render their emails. Runs on the enrichment pool."""
+    # Contacts of a resumed campaign keep the enrichment they already got
+    to_enrich = [row for row in rows if row.get("enriched") is None]
+    enriched = iter([])
+    if to_enrich:
+        print(f"Enriching contact data for: {', '.join(str(row['email']) for row in to_enrich)}")
+        enriched = iter(enrich_contacts(to_enrich, openai_client, company_cache, stats))
+    return [
+        render_contact(row, row["enriched"] if row.get("enriched") is not None else next(enriched), template_fr, template_en)
+        for row in rows
+    ]
+
+def submit_batch(pool, prepare, rows):
+    """Submit one batch to the pool and return a future per row."""
+    futures = [Future() for _ in rows]
+
+    def resolve(job):
+        try:
+            results = job.result()
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    pool.submit(prepare, rows).add_done_callback(resolve)
+    return futures
+
+def enrichment_pipeline(rows, pool, workers, prepare, batch_size=1):
+    """
+    Yield (row, future) pairs in sheet order while keeping up to
+    ENRICHMENT_LOOKAHEAD batches per worker in flight on the pool.
+    Rows flagged as duplicates or already contacted by prepare_contact_frame,
+    and rows a resumed campaign already sent, are yielded with a None future
+    so the caller can report them in order.
+    """
+    pending = deque()
+    staged = []  # Rows read since the last batch was submitted
+    batch = []
+    rows = iter(rows)
+    exhausted = False
+
+    def flush():
+        futures = iter(submit_batch(pool, prepare, list(batch))) if batch else iter(())
+        for row, is_skipped in staged:
+            pending.append((row, None if is_skipped else next(futures)))
+        staged.clear()
+        batch.clear()
+
+    while True:
+        while not exhausted and len(pending) < workers * batch_size * ENRICHMENT_LOOKAHEAD:
+            try:
+                row = next(rows)
+            except StopIteration:
+                exhausted = True
+                flush()
+                break
+            is_skipped = row['duplicate'] or row['contacted'] or row.get('resumed_record') is not None
+            staged.append((row, is_skipped))
+            if not is_skipped:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    flush()
+
+        if not pending:
+            return
+        yield pending.popleft()
+
+def dispatch_contacts(ready, smtp_pool, checkpointer=None):
+    """
+    Hand enriched contacts to the SMTP pool in sheet order. Runs on its own
+    thread. Stops at the first error that would affect every remaining
+    contact (e.g. a rejected OpenAI key) and records it on the pool.
+    """
+    error = None
     try:
-        response = client.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.5,
-            max_tokens=500
-        )
-        raw_text = response.choices[0].message.content
-        cleaned = re.sub(r"^```(?:json)?", "", raw_text.strip())
-        cleaned = re.sub(r"```$", "", cleaned.strip())
-        result = json.loads(cleaned)
-        
-        # Validate required fields
-        required_fields = ["language", "civility", "hq", "ftes", "description"]
-        for field in required_fields:
-            if field not in result:
-                result[field] = ""
-        
-        # Ensure language is either "French" or "English"
-        if result["language"] not in ["French", "English"]:
-            result["language"] = "English"
-        
-        # Ensure civility is appropriate for the language
-        if result["language"] == "French":
-            if result["civility"] not in ["Monsieur", "Madame"]:
-                result["civility"] = "Monsieur"
-        else:
-            if result["civility"] not in ["Mr", "Ms"]:
-                result["civility"] = "Mr"
-        
-        return result
+        for row, future in ready:
+            # No new rows (and so no new enrichment batches) while paused
+            if not smtp_pool.wait_running():
+                break
+            email = row['email']
+            if future is None:
+                if row.get('resumed_record') is not None:
+                    smtp_pool.emit("status", f"✓ Already sent to {email}", record=row['resumed_record'])
+                elif row['contacted']:
+                    smtp_pool.emit("status", f"✕ Skipping {email}, already contacted")
+                else:
+                    smtp_pool.emit("status", f"✕ Skipping duplicate email {email}")
+                continue
+
+            smtp_pool.emit("status", f"...preparing email for {row['first_name']} {row['last_name']} ({email})...")
+            try:
+                prepared = future.result()
+            except EnrichmentAuthError:
+                raise
+            except Exception as e:
+                print(f"Error processing {email}: {str(e)}")
+                smtp_pool.emit("error", f"Error processing {email}: {str(e)}")
+                continue
+
+            enriched = prepared["enriched"]
+            if checkpointer is not None:
+                checkpointer.enriched(row, enriched)
+            record = {column: row.get(column, "") for column in OUTPUT_COLUMNS}
+            record["HQ"] = enriched.get("hq", "")
+            record["FTEs"] = enriched.get("ftes", "")
+            record["description"] = enriched.get("description", "")
+            job = {
+                "row_index": row["row_index"],
+                "email": email,
+                "subject": prepared["subject"],
+                "body": prepared["body"],
+                "record": record
+            }
+            if not smtp_pool.submit(job):
+                print("No SMTP account left to send with, stopping")
+                if smtp_pool.quota_exhausted():
+                    smtp_pool.emit("status", "⏸ Campaign paused: every SMTP account reached its daily quota")
+                break
+    except EnrichmentAuthError as e:
+        error = f"OpenAI rejected the API key: {str(e)}"
+        print(f"Stopping campaign, {error}")
+        smtp_pool.emit("error", f"✕ Campaign stopped, {error}")
     except Exception as e:
-        print(f"Error enriching contact: {str(e)}")
-        # Return default values if enrichment fails
-        return {
-            "language": "English",
-            "civility": "Mr",
-            "hq": "",
-            "ftes": "",
-            "description": ""
-        }
-
-def get_school(education):
-    if pd.isna(education):
-        return "École polytechnique"
-    return "HEC Paris" if str(education).strip().lower() == "hec paris" else "École polytechnique"
-
-def get_subject(language, school):
-    return f"{school} * {'Projet de Structuration de Données' if language == 'French' else 'Structured Data Project'}"
-
-def fill_template(template, placeholders):
-    for key, value in placeholders.items():
-        template = template.replace(f"[{key.upper()}]", value)
-    return template
+        error = f"Error dispatching contacts: {str(e)}"
+        print(error)
+        smtp_pool.emit("error", error)
+    finally:
+        smtp_pool.finish(error)
 
 def send_email(to_email, subject, body, smtp_config, use_cc=False):
     msg = MIMEMultipart()
@@ -346,7 +470,24 @@ def send_email(to_email, subject, body, smtp_config, use_cc=False):
         print(f"Error sending email to {to_email}: {str(e)}")
         return str(e)
 
-def run_from_ui(sheet_url, preview_only=False, email=None, use_cc=False):
+def run_from_ui(sheet_url, preview_only=False, email=None, use_cc=False, refresh_enrichment=False, campaign_id=None):
+    """
+    Preview or run a campaign, streaming JSON events. Passing the id of an
+    earlier campaign resumes it: contacts it already sent are not sent
+    again and stored enrichment is reused.
+    """
+    campaign = None
+    if campaign_id:
+        campaign = get_campaign(campaign_id)
+        if not campaign or campaign["owner"] != email:
+            yield json.dumps({"type": "error", "message": f"Campaign {campaign_id} not found"})
+            return
+        if not preview_only and campaign["status"] not in RESUMABLE_CAMPAIGN_STATUSES:
+            yield json.dumps({"type": "error", "message": f"Campaign {campaign_id} is {campaign['status']} and can't be resumed"})
+            return
+        sheet_url = campaign["sheet_url"]
+        use_cc = campaign["use_cc"]
+
     if not sheet_url:
         yield json.dumps({"type": "error", "message": "Google Sheet URL is required"})
         return
@@ -360,177 +501,205 @@ def run_from_ui(sheet_url, preview_only=False, email=None, use_cc=False):
         print(f"Getting templates for user: {email}")
         template_fr, template_en = get_templates(email)
         print(f"Getting SMTP config for user: {email}")
-        smtp_config = get_smtp_config(email)
-        print(f"SMTP config: {smtp_config}")
+        smtp_configs, smtp_errors = get_smtp_configs(email)
+        print(f"SMTP accounts: {[smtp_config['username'] for smtp_config in smtp_configs]}")
         print(f"Getting OpenAI client for user: {email}")
         openai_client = get_openai_client(email)
         
-        # Read from Google Sheet
+        # Read from Google Sheet. Previews load it whole; campaigns stream it
+        # in chunks so memory stays flat whatever the sheet size.
         print(f"Reading data from Google Sheet: {sheet_url}")
-        df = get_sheet_data(sheet_url)
+        if preview_only:
+            df = read_sheet(sheet_url)
+            chunks = iter(())
+        else:
+            chunks = iter_sheet_chunks(sheet_url)
+            df = next(chunks, pd.DataFrame())
         if df.empty:
             yield json.dumps({"type": "error", "message": "No data found in the Google Sheet"})
             return
 
         # Validate required columns
-        required_columns = ['first_name', 'last_name', 'email', 'company', 'role', 'education', 'location']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
         if missing_columns:
             yield json.dumps({"type": "error", "message": f"Missing required columns: {', '.join(missing_columns)}"})
             return
 
-        # Send all contacts for preview
+        for smtp_error in smtp_errors:
+            yield json.dumps({"type": "status", "message": f"✕ Skipping SMTP account {smtp_error}"})
+        for name, template in (("French", template_fr), ("English", template_en)):
+            if template.unknown:
+                unknown = ", ".join(f"[{placeholder}]" for placeholder in template.unknown)
+                yield json.dumps({"type": "status", "message": f"⚠ {name} template has unknown placeholders left as is: {unknown}"})
+
+        # Send all contacts for preview (campaigns send the first chunk)
         preview_data = df.to_dict('records')
         yield json.dumps({"type": "preview", "data": preview_data})
+        del preview_data
         
         # If this is just a preview request, stop here
         if preview_only:
             return
 
-        enriched_rows = []
+        workers, batch_size = get_enrichment_settings(email)
+        print(f"Using {workers} enrichment workers with batches of {batch_size}")
+        # In merge mode, sent contacts are also upserted into the user's contact list
+        merge_contact_list = bool((get_user_config(email) or {}).get("merge_contact_list"))
+
+        # Campaign state is checkpointed so an interrupted run can be resumed.
+        # From here on the campaign is running, and the finally block below
+        # records how it ended.
+        if campaign is None:
+            campaign_id = uuid.uuid4().hex
+            create_campaign(campaign_id, email, sheet_url, use_cc)
+            checkpoints = {}
+            campaign_message = f"→ Started campaign {campaign_id}"
+        else:
+            # Another job may have resumed it since the check above
+            if not claim_campaign(campaign_id, email):
+                yield json.dumps({"type": "error", "message": f"Campaign {campaign_id} is already being resumed"})
+                return
+            checkpoints = get_campaign_checkpoints(campaign_id)
+            already_sent = sum(1 for state in checkpoints.values() if state["status"] == "sent")
+            campaign_message = f"→ Resuming campaign {campaign_id}: {already_sent} emails already sent"
+        sent_contacts = SentContactSpool(OUTPUT_COLUMNS)
         today_str = datetime.today().strftime("%B %d, %Y")
-        processed_emails = set()  # Track emails processed in this run
-
-        # Create a single SMTP connection for all emails
-        server = None
+        company_cache = CompanyCache(refresh=refresh_enrichment)
+        enrichment_stats = EnrichmentStats()
+
+        # One sender thread and SMTP session per account
+        smtp_pool = SmtpPool(
+            smtp_configs, use_cc=use_cc, rediscover=rediscover_smtp_config,
+            on_sent=lambda job, account: (
+                record_sent_email(email, campaign_id, job["email"], account),
+                checkpointer.sent(job, account)
+            )
+        )
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enrich")
+        checkpointer = CampaignCheckpointer(campaign_id, contact_owner=email if merge_contact_list else None)
+        campaign_status = "interrupted"  # Kept if the client goes away mid-run
         try:
-            print(f"Creating SMTP connection to {smtp_config['server']}:{smtp_config['port']}")
-            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
-            print("Starting TLS connection...")
-            server.starttls()
-            print(f"Logging in with username: {smtp_config['username']}")
-            server.login(smtp_config['username'], smtp_config['password'])
-            yield json.dumps({"type": "status", "message": "✓ SMTP connection established"})
-
-            for _, row in df.iterrows():
-                email = row['email']
-                if email in processed_emails:
-                    yield json.dumps({"type": "status", "message": f"✕ Skipping duplicate email {email}"})
-                    continue
-
-                processed_emails.add(email)
-                msg = f"...preparing email for {row['first_name']} {row['last_name']} ({email})..."
-                yield json.dumps({"type": "status", "message": msg})
-
-                try:
-                    print(f"Enriching contact data for: {email}")
-                    enriched = enrich_contact(row, openai_client)
-                    civility = enriched["civility"]
-                    language = enriched["language"]
-                    hq = enriched.get("hq", "")
-                    ftes = enriched.get("ftes", "")
-                    description = enriched.get("description", "")
-                    school = get_school(row["education"])
-                    subject = get_subject(language, school)
-
-                    placeholders = {
-                        "CIVILITÉ": civility,
-                        "CIVILITY": civility,
-                        "LAST_NAME": row["last_name"],
-                        "COMPANY": row["company"],
-                        "SCHOOL": school
-                    }
-
-                    template = template_fr if language == "French" else template_en
-                    email_body = fill_template(template, placeholders)
-
-                    # Create and send email using the existing connection
-                    msg = MIMEMultipart()
-                    msg["From"] = smtp_config['username']
-                    msg["To"] = email
-                    msg["Subject"] = subject
-                    if use_cc:
-                        msg["Cc"] = smtp_config['username']
-                    else:
-                        msg["Bcc"] = smtp_config['username']
-                    msg.attach(MIMEText(email_body, "html"))
+            yield json.dumps({"type": "campaign", "campaign_id": campaign_id, "message": campaign_message})
+            for event in smtp_pool.connect():
+                yield json.dumps(event)
+
+            # Enrichment runs ahead of the senders on the worker pool, so the
+            # SMTP stage only waits on the LLM when the pool falls behind.
+            contacts = iter_prepared_contacts(
+                itertools.chain([df], chunks), today_str,
+                # One ledger lookup per sheet chunk
+                find_contacted=lambda addresses: get_contacted_recipients(email, addresses)
+            )
+            ready = enrichment_pipeline(
+                apply_checkpoints(contacts, checkpoints) if checkpoints else contacts,
+                pool, workers,
+                lambda rows: prepare_contacts(rows, openai_client, template_fr, template_en, company_cache, enrichment_stats),
+                batch_size=batch_size
+            )
+            dispatcher = threading.Thread(
+                target=dispatch_contacts, args=(ready, smtp_pool, checkpointer),
+                name="dispatch", daemon=True
+            )
+            dispatcher.start()
 
+            def progress():
+                while True:
                     try:
-                        # Verify SMTP connection is still active
-                        if not server.noop()[0] == 250:
-                            print("SMTP connection lost, reconnecting...")
-                            yield json.dumps({"type": "error", "message": "SMTP connection lost, reconnecting..."})
-                            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
-                            server.starttls()
-                            server.login(smtp_config['username'], smtp_config['password'])
-
-                        print(f"Sending email to: {email}")
-                        server.send_message(msg)
-                        print(f"Email sent successfully to: {email}")
-                        enriched_rows.append({
-                            "company": row["company"],
-                            "account_owner": "",
-                            "status": "Contacted",
-                            "industry": "",
-                            "HQ": hq,
-                            "FTEs": ftes,
-                            "description": description,
-                            "first_name": row["first_name"],
-                            "last_name": row["last_name"],
-                            "email": email,
-                            "role": row["role"],
-                            "education": row["education"],
-                            "location": row["location"],
-                            "notes": "",
-                            "added": "",
-                            "last_contact": today_str
-                        })
-
-                        yield json.dumps({"type": "status", "message": f"✓ Email sent to {email}"})
-                        time.sleep(2)  # Add a small delay between emails
-                    except Exception as e:
-                        print(f"Error sending email to {email}: {str(e)}")
-                        yield json.dumps({"type": "error", "message": f"Failed to send email to {email}: {str(e)}"})
-                        # Try to reconnect if there's an error
-                        try:
-                            print("Attempting to reconnect to SMTP server...")
-                            server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
-                            server.starttls()
-                            server.login(smtp_config['username'], smtp_config['password'])
-                            print("Successfully reconnected to SMTP server")
-                            yield json.dumps({"type": "status", "message": "✓ SMTP connection reestablished"})
-                        except Exception as reconnect_error:
-                            print(f"Failed to reconnect to SMTP server: {str(reconnect_error)}")
-                            yield json.dumps({"type": "error", "message": f"Failed to reconnect to SMTP server: {str(reconnect_error)}"})
-                            break
+                        event, record = smtp_pool.events.get(timeout=0.5)
+                    except queue.Empty:
+                        if not dispatcher.is_alive() and not smtp_pool.is_active() and smtp_pool.events.empty():
+                            return
+                        # Empty heartbeat so a scheduler can pause the run between sends
+                        yield ""
                         continue
-
-                except Exception as e:
-                    print(f"Error processing {email}: {str(e)}")
-                    yield json.dumps({"type": "error", "message": f"Error processing {email}: {str(e)}"})
-                    continue
+                    if record is not None:
+                        sent_contacts.append(record)
+                    yield json.dumps(event)
+                    if event["message"].startswith(("✓ Email sent", "Failed to send")):
+                        yield json.dumps({"type": "stats", "accounts": smtp_pool.stats()})
+
+            for line in progress():
+                # The run is paused for as long as the caller holds this
+                # line, e.g. while a job scheduler gives other campaigns
+                # their time slice, so it doesn't keep sending in between
+                smtp_pool.pause()
+                yield line
+                smtp_pool.resume()
+
+            if smtp_pool.aborted:
+                campaign_status = "failed"
+            elif smtp_pool.quota_exhausted():
+                campaign_status = "paused"
+            elif any(account["failed"] for account in smtp_pool.stats()):
+                campaign_status = "incomplete"
+            else:
+                campaign_status = "completed"
 
         except Exception as e:
+            campaign_status = "failed"
             print(f"SMTP connection error: {str(e)}")
             yield json.dumps({"type": "error", "message": f"SMTP connection error: {str(e)}"})
             return
         finally:
-            if server:
-                try:
-                    server.quit()
-                    print("SMTP connection closed")
-                    yield json.dumps({"type": "status", "message": "✓ SMTP connection closed"})
-                except Exception as e:
-                    print(f"Error closing SMTP connection: {str(e)}")
-
-        if not enriched_rows:
-            yield json.dumps({"type": "error", "message": "No emails were sent successfully"})
+            pool.shutdown(wait=False, cancel_futures=True)
+            smtp_pool.shutdown()
+            checkpointer.close()
+            update_campaign_status(campaign_id, campaign_status)
+
+        for account in smtp_pool.stats():
+            yield json.dumps({"type": "status", "message": f"→ {account['account']}: {account['sent']} sent, {account['failed']} failed"})
+
+        if enrichment_stats.auth_failed:
+            # Make the next campaign check the key again instead of trusting the stored result
+            invalidate_openai_key_status(email)
+            yield json.dumps({"type": "status", "message": "✕ OpenAI rejected the API key during enrichment, please check it in your settings"})
+
+        print(f"Company cache: {company_cache.hits} hits, {company_cache.misses} misses")
+        yield json.dumps({"type": "status", "message": f"→ Company enrichment cache: {company_cache.hits} hits, {company_cache.misses} lookups"})
+        if enrichment_stats.requests:
+            yield json.dumps({"type": "status", "message": (
+                f"→ Batched enrichment: {enrichment_stats.requests} requests for {enrichment_stats.contacts} contacts, "
+                f"saved {enrichment_stats.requests_saved} requests and ~{enrichment_stats.prompt_tokens_saved} prompt tokens "
+                f"({enrichment_stats.fallbacks} fell back to single requests)"
+            )})
+
+        # How the run ended, also read by the job scheduler
+        if campaign_status == "failed":
+            outcome = {"type": "error", "message": f"✕ Campaign {campaign_id} stopped early, resume it once fixed"}
+        elif campaign_status == "paused":
+            outcome = {"type": "status", "message": f"⏸ Paused: daily quota reached, resume campaign {campaign_id} once it resets"}
+        elif campaign_status == "incomplete":
+            unsent = sum(account["failed"] for account in smtp_pool.stats())
+            outcome = {"type": "status", "message": f"⚠ Incomplete: {unsent} contacts not sent, resume campaign {campaign_id} to retry them"}
+        else:
+            outcome = {"type": "status", "message": "✓ All emails sent successfully"}
+        outcome["campaign_status"] = campaign_status
+
+        if not sent_contacts.count:
+            sent_contacts.close()
+            if campaign_status == "completed":
+                yield json.dumps({"type": "error", "message": "No emails were sent successfully"})
+            else:
+                yield json.dumps(outcome)
             return
 
         # Save updated contact list to Downloads
         try:
             print(f"Saving enriched contact list to: {UPDATED_LIST_PATH}")
-            final_df = pd.DataFrame(enriched_rows)
-            grouped_df = final_df.groupby("company").agg(lambda x: "\n".join(x.dropna().astype(str).unique())).reset_index()
-            ordered_cols = [
-                "company", "account_owner", "status", "industry", "HQ", "FTEs", "description",
-                "first_name", "last_name", "email", "role", "education", "location", "notes", "added", "last_contact"
-            ]
-
-            grouped_df[ordered_cols].to_excel(UPDATED_LIST_PATH, index=False, engine='openpyxl')
+            if merge_contact_list:
+                # The checkpointer wrote this run's contacts to the store when it closed
+                sent_contacts.close()
+                total = write_contact_list(email, UPDATED_LIST_PATH)
+                message = f"→ Contact list with {total} contacts from all campaigns saved to: {UPDATED_LIST_PATH}"
+            else:
+                final_df = sent_contacts.to_dataframe()
+                sent_contacts.close()
+                grouped_df = group_by_company(final_df, OUTPUT_COLUMNS)
+                write_xlsx(UPDATED_LIST_PATH, OUTPUT_COLUMNS, [grouped_df])
+                message = f"→ Updated contact list saved to: {UPDATED_LIST_PATH}"
             print(f"Successfully saved enriched contact list to: {UPDATED_LIST_PATH}")
-            yield json.dumps({"type": "status", "message": f"→ Updated contact list saved to: {UPDATED_LIST_PATH}"})
-            yield json.dumps({"type": "status", "message": "✓ All emails sent successfully"})
+            yield json.dumps({"type": "status", "message": message})
+            yield json.dumps(outcome)
         except Exception as e:
             print(f"Error saving enriched contact list: {str(e)}")
             yield json.dumps({"type": "error", "message": f"Error saving enriched contact list: {str(e)}"})
@@ -547,4 +716,5 @@ if __name__ == "__main__":
     sheet_url = sys.argv[1]
     email = sys.argv[2]
     for message in run_from_ui(sheet_url, email=email):
-        print(message)
+        if message:
+            print(message)
@@ -0,0 +1,344 @@
+import io
+import os
+import re
+import csv
+import codecs
+import time
+import hashlib
+import tempfile
+import threading
+import weakref
+from concurrent.futures import Future
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# Rows parsed per DataFrame when streaming a sheet
+SHEET_CHUNK_SIZE = int(os.getenv("SHEET_CHUNK_SIZE", 1000))
+
+# === DOWNLOAD CACHE SETTINGS ===
+SHEET_CACHE_TTL = float(os.getenv("SHEET_CACHE_TTL", 30))  # Seconds a download is reused without asking Google
+SHEET_CACHE_MAX_ENTRIES = 32
+SHEET_CACHE_MAX_BYTES = int(os.getenv("SHEET_CACHE_MAX_BYTES", 5 * 1024 * 1024))  # Larger exports are spooled to disk
+SHEET_FETCH_TIMEOUT = 10
+SHEET_DOWNLOAD_BLOCK = 64 * 1024
+SHEET_PREVIEW_BLOCK = 8 * 1024  # Small reads, so a preview stops close to the rows it needs
+
+def extract_sheet_id(url):
+    # Extract sheet ID from Google Sheets URL
+    pattern = r'/d/([a-zA-Z0-9-_]+)'
+    match = re.search(pattern, url)
+    if not match:
+        raise ValueError("Invalid Google Sheet URL")
+    return match.group(1)
+
+def get_sheet_csv_url(sheet_url):
+    sheet_id = extract_sheet_id(sheet_url)
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+
+def create_session():
+    """HTTP session that keeps connections to Google open between downloads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+class SheetDownload:
+    """
+    One downloaded CSV export and the validators needed to revalidate it.
+    Exports up to `max_bytes` are kept in memory; larger ones are spooled to
+    a temporary file, removed once the download is no longer referenced.
+    """
+
+    def __init__(self, sheet_id, content=None, path=None, content_hash=None,
+                 etag=None, last_modified=None, checked_at=0):
+        self.sheet_id = sheet_id
+        self.content = content
+        self.path = path
+        self.content_hash = content_hash or hashlib.sha256(content).hexdigest()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = checked_at
+        if path is not None:
+            weakref.finalize(self, remove_file, path)
+
+    @classmethod
+    def from_response(cls, sheet_id, response, max_bytes=SHEET_CACHE_MAX_BYTES, checked_at=0):
+        """Read a whole export off a streamed response, spooling it to disk past `max_bytes`."""
+        digest = hashlib.sha256()
+        buffer = io.BytesIO()
+        spool = None
+        try:
+            for block in response.iter_content(SHEET_DOWNLOAD_BLOCK):
+                digest.update(block)
+                if spool is None and buffer.tell() + len(block) > max_bytes:
+                    spool = tempfile.NamedTemporaryFile(prefix="sheet-", suffix=".csv", delete=False)
+                    spool.write(buffer.getvalue())
+                    buffer = None
+                (spool or buffer).write(block)
+        except BaseException:
+            if spool is not None:
+                spool.close()
+                remove_file(spool.name)
+            raise
+
+        validators = {
+            "content_hash": digest.hexdigest(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "checked_at": checked_at
+        }
+        if spool is None:
+            return cls(sheet_id, content=buffer.getvalue(), **validators)
+        spool.close()
+        return cls(sheet_id, path=spool.name, **validators)
+
+    def open(self):
+        """Binary file object over the export."""
+        if self.path is not None:
+            return open(self.path, "rb")
+        return io.BytesIO(self.content)
+
+def download_sheet(csv_url, session, sheet_id=None, headers=None, max_bytes=SHEET_CACHE_MAX_BYTES, checked_at=0):
+    """
+    Download an export in full before anything reads it, so a slow reader
+    (a campaign paced by SMTP limits) never holds the connection to Google
+    open. Returns None when the server answers 304 Not Modified.
+    """
+    with session.get(csv_url, headers=headers, timeout=SHEET_FETCH_TIMEOUT, stream=True) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return SheetDownload.from_response(sheet_id, response, max_bytes, checked_at)
+
+class SheetCache:
+    """
+    Short-lived cache of sheet exports keyed by sheet id, so the preview,
+    download and campaign requests the UI makes back to back share one
+    download. Entries older than `ttl` are revalidated with a conditional
+    request, or by comparing the content hash when Google sends no
+    validators. Concurrent fetches of the same sheet wait on one download.
+    Exports above `max_bytes` are kept on disk rather than in memory.
+    """
+
+    def __init__(self, ttl=SHEET_CACHE_TTL, max_entries=SHEET_CACHE_MAX_ENTRIES,
+                 max_bytes=SHEET_CACHE_MAX_BYTES, session=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.session = session or create_session()
+        self.clock = clock
+        self.hits = 0
+        self.revalidated = 0
+        self.downloads = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+
+    def peek(self, sheet_id):
+        """Return the cached download if it is still fresh, without any request."""
+        with self._lock:
+            entry = self._entries.get(sheet_id)
+            if entry is not None and self.clock() - entry.checked_at < self.ttl:
+                self.hits += 1
+                return entry
+        return None
+
+    def fetch(self, sheet_id, csv_url):
+        """Return the current export of a sheet, downloading it only when needed."""
+        with self._lock:
+            entry = self._entries.get(sheet_id)
+            if entry is not None and self.clock() - entry.checked_at < self.ttl:
+                self.hits += 1
+                return entry
+            future = self._inflight.get(sheet_id)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[sheet_id] = future
+            else:
+                self.coalesced += 1
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            download = self._download(sheet_id, csv_url, entry)
+            future.set_result(download)
+            return download
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(sheet_id, None)
+
+    def _download(self, sheet_id, csv_url, entry):
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        download = download_sheet(
+            csv_url, self.session, sheet_id=sheet_id, headers=headers,
+            max_bytes=self.max_bytes, checked_at=self.clock()
+        )
+        if download is None:
+            with self._lock:
+                entry.checked_at = self.clock()
+                self.revalidated += 1
+            return entry
+
+        with self._lock:
+            self.downloads += 1
+            if entry is not None and entry.content_hash == download.content_hash:
+                # Same content: keep the cached copy and just extend its freshness
+                entry.checked_at = download.checked_at
+                entry.etag = download.etag or entry.etag
+                entry.last_modified = download.last_modified or entry.last_modified
+                self.revalidated += 1
+                return entry
+            self._store(download)
+        return download
+
+    def _store(self, download):
+        self._entries.pop(download.sheet_id, None)
+        while len(self._entries) >= self.max_entries:
+            oldest = min(self._entries.values(), key=lambda entry: entry.checked_at)
+            del self._entries[oldest.sheet_id]
+        self._entries[download.sheet_id] = download
+
+    def invalidate(self, sheet_id=None):
+        """Forget one sheet, or every sheet when no id is given."""
+        with self._lock:
+            if sheet_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(sheet_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "downloads": self.downloads,
+                "coalesced": self.coalesced
+            }
+
+# Shared by every endpoint of the process
+sheet_cache = SheetCache()
+
+def fetch_sheet(sheet_url):
+    """Return the sheet's CSV export as a SheetDownload, served from the cache when fresh."""
+    return sheet_cache.fetch(extract_sheet_id(sheet_url), get_sheet_csv_url(sheet_url))
+
+def read_sheet(sheet_url):
+    """Return the whole sheet as a DataFrame."""
+    with fetch_sheet(sheet_url).open() as f:
+        return pd.read_csv(f, encoding="utf-8")
+
+def iter_response_lines(response, block_size=SHEET_PREVIEW_BLOCK):
+    """Decode a streamed response as UTF-8 lines, line endings included."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for block in response.iter_content(block_size):
+        pending += decoder.decode(block)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+def read_csv_head(lines, rows):
+    """
+    Text of the header and the first `rows` records of a CSV read line by
+    line, without reading further. Quoted fields may span several lines.
+    """
+    head = []
+    quotes = 0
+    records = 0
+    for line in lines:
+        head.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            records += 1
+            if records > rows:
+                break
+    return "".join(head)
+
+def read_sheet_head(sheet_url, rows):
+    """
+    Return the first `rows` data rows of the sheet. A fresh cached copy is
+    used when there is one; otherwise only the start of the export is
+    downloaded, outside the cache, so the preview takes the same time for
+    any sheet size and never holds up a full download of the same sheet.
+    """
+    cached = sheet_cache.peek(extract_sheet_id(sheet_url))
+    if cached is not None:
+        with cached.open() as f:
+            return pd.read_csv(f, encoding="utf-8", nrows=rows)
+
+    csv_url = get_sheet_csv_url(sheet_url)
+    with sheet_cache.session.get(csv_url, timeout=SHEET_FETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        head = read_csv_head(iter_response_lines(response), rows)
+    return pd.read_csv(io.StringIO(head), nrows=rows)
+
+def to_json_records(df):
+    """Convert a DataFrame to records with NaN values replaced by None."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def iter_sheet_chunks(sheet_url, chunksize=SHEET_CHUNK_SIZE, csv_url=None):
+    """
+    Yield the sheet as DataFrames of at most `chunksize` rows. The export is
+    fetched whole through the cache (large ones on disk) when the first
+    chunk is asked for, then parsed one chunk at a time, so memory stays
+    flat and no connection stays open while the chunks are consumed.
+    `csv_url` overrides the export URL and skips the cache (used by the
+    benchmarks).
+    """
+    if csv_url is None:
+        download = fetch_sheet(sheet_url)
+    else:
+        download = download_sheet(csv_url, sheet_cache.session)
+    with download.open() as f:
+        yield from pd.read_csv(f, encoding="utf-8", chunksize=chunksize)
+
+class SentContactSpool:
+    """
+    Appends sent contact records to a temporary CSV file so a long campaign
+    doesn't keep every record in memory until the output is written.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.count = 0
+        self.file = tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=columns)
+        self.writer.writeheader()
+
+    def append(self, record):
+        self.writer.writerow({
+            column: "" if pd.isna(record.get(column)) else record.get(column)
+            for column in self.columns
+        })
+        self.count += 1
+
+    def to_dataframe(self):
+        self.file.flush()
+        self.file.seek(0)
+        return pd.read_csv(self.file, dtype=str)
+
+    def close(self):
+        self.file.close()
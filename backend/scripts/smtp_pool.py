@@ -0,0 +1,354 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from db.config_db import get_smtp_sent_today, increment_smtp_sent
+
+DEFAULT_SEND_INTERVAL = 2  # Seconds between two sends from the same account
+DEFAULT_SEND_BURST = int(os.getenv("SMTP_SEND_BURST", 1))
+DEFAULT_DAILY_LIMIT = int(os.getenv("SMTP_DAILY_LIMIT", 400))
+QUEUE_SLOTS_PER_ACCOUNT = 2  # Ready messages buffered per account
+
+# Rate adaptation
+MIN_SEND_RATE = 1 / 120  # Never slow an account below one send per two minutes
+RATE_DECREASE_FACTOR = 0.5  # Applied on every throttling reply
+RATE_INCREASE_STEP = 0.05  # Fraction of the configured rate regained per success
+THROTTLE_CODES = {421, 450, 451, 452}
+MAX_SEND_ATTEMPTS = 3
+
+class SendRateScheduler:
+    """
+    Token bucket pacing one SMTP account. Tokens refill at `rate` per second
+    up to `burst`. Throttling replies halve the rate and empty the bucket;
+    each success then raises it by a small step back up to the configured
+    rate. `clock` is injectable so the schedule can be driven in tests.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=MIN_SEND_RATE, clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token if one is available. Returns 0, or the seconds to wait before retrying."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Give back a token that was reserved but not used."""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_INCREASE_STEP)
+
+    def on_throttle(self):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+        self.tokens = 0
+
+def is_throttling_error(error):
+    """Whether an SMTP error is a temporary rate-limit reply worth retrying."""
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code in THROTTLE_CODES
+
+def open_smtp_session(smtp_config):
+    """Open and authenticate an SMTP session for one account."""
+    print(f"Creating SMTP connection to {smtp_config['server']}:{smtp_config['port']}")
+    if smtp_config.get('use_ssl', False):
+        server = smtplib.SMTP_SSL(smtp_config['server'], smtp_config['port'])
+    else:
+        server = smtplib.SMTP(smtp_config['server'], smtp_config['port'])
+        print("Starting TLS connection...")
+        server.starttls()
+    print(f"Logging in with username: {smtp_config['username']}")
+    server.login(smtp_config['username'], smtp_config['password'])
+    return server
+
+def build_message(smtp_config, to_email, subject, body, use_cc=False):
+    msg = MIMEMultipart()
+    msg["From"] = smtp_config['username']
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    if use_cc:
+        msg["Cc"] = smtp_config['username']
+    else:
+        msg["Bcc"] = smtp_config['username']
+    msg.attach(MIMEText(body, "html"))
+    return msg
+
+class AccountSender(threading.Thread):
+    """Sends queued messages from one SMTP account over a persistent session."""
+
+    def __init__(self, pool, smtp_config):
+        super().__init__(name=f"smtp-{smtp_config['username']}", daemon=True)
+        self.pool = pool
+        self.smtp_config = smtp_config
+        send_interval = float(smtp_config.get('send_interval') or DEFAULT_SEND_INTERVAL)
+        self.scheduler = SendRateScheduler(
+            1 / send_interval,
+            burst=int(smtp_config.get('send_burst') or DEFAULT_SEND_BURST),
+            clock=pool.clock
+        )
+        self.daily_limit = int(smtp_config.get('daily_limit') or DEFAULT_DAILY_LIMIT)
+        self.sent_today = 0
+        self.server = None
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+
+    @property
+    def username(self):
+        return self.smtp_config['username']
+
+    def stats(self):
+        return {
+            "account": self.username,
+            "sent": self.sent,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "rate_per_minute": round(self.scheduler.rate * 60, 2),
+            "sent_today": self.sent_today,
+            "daily_limit": self.daily_limit,
+            "active": self.is_alive()
+        }
+
+    def has_quota(self):
+        return self.sent_today < self.daily_limit
+
+    def connect(self):
+        self.sent_today = get_smtp_sent_today(self.username)
+        try:
+            self.server = open_smtp_session(self.smtp_config)
+        except Exception as e:
+            if not self.smtp_config.get('method_cached') or self.pool.rediscover is None:
+                raise
+            # The stored connection method may be stale, find a working one
+            print(f"Cached SMTP connection method failed for {self.username} ({str(e)}), probing again")
+            self.smtp_config = self.pool.rediscover(self.smtp_config)
+            self.server = open_smtp_session(self.smtp_config)
+
+    def is_connected(self):
+        try:
+            return self.server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def run(self):
+        try:
+            while self.pool.wait_running():
+                if not self.has_quota():
+                    print(f"{self.username} reached its daily quota of {self.daily_limit} emails")
+                    self.pool.emit("status", f"⏸ {self.username} reached its daily quota of {self.daily_limit} emails")
+                    break
+
+                delay = self.scheduler.reserve()
+                if delay > 0:
+                    self.pool.stop.wait(delay)
+                    continue
+
+                job = self.pool.next_job()
+                if job is None:
+                    self.scheduler.refund()
+                    if self.pool.done.is_set() and self.pool.is_drained():
+                        break
+                    continue
+                if not self.send(job):
+                    break
+        finally:
+            self.close()
+
+    def send(self, job):
+        """Send one message. Returns False when the session can't be recovered."""
+        to_email = job["email"]
+        msg = build_message(self.smtp_config, to_email, job["subject"], job["body"], self.pool.use_cc)
+        try:
+            # Verify SMTP connection is still active, the provider may have
+            # dropped it while the run was paused
+            if not self.is_connected():
+                print("SMTP connection lost, reconnecting...")
+                self.pool.emit("error", "SMTP connection lost, reconnecting...")
+                self.connect()
+
+            print(f"Sending email to: {to_email} from {self.username}")
+            self.server.send_message(msg)
+            print(f"Email sent successfully to: {to_email}")
+            self.sent += 1
+            self.sent_today = increment_smtp_sent(self.username)
+            self.scheduler.on_success()
+            self.pool.record_sent(job, self.username)
+            self.pool.emit("status", f"✓ Email sent to {to_email}", record=job.get("record"))
+            return True
+        except Exception as e:
+            attempts = job.get("attempts", 0) + 1
+            if is_throttling_error(e) and attempts < MAX_SEND_ATTEMPTS:
+                # The provider asked us to slow down: back off and let any
+                # account pick the message up again later
+                print(f"{self.username} throttled ({e.smtp_code}) while sending to {to_email}")
+                self.throttled += 1
+                self.scheduler.on_throttle()
+                self.pool.retry({**job, "attempts": attempts})
+                self.pool.emit("status", f"↻ {self.username} throttled ({e.smtp_code}), retrying {to_email} later")
+                return True
+
+            print(f"Error sending email to {to_email}: {str(e)}")
+            self.failed += 1
+            self.pool.emit("error", f"Failed to send email to {to_email}: {str(e)}")
+            # Try to reconnect if there's an error
+            try:
+                print("Attempting to reconnect to SMTP server...")
+                self.connect()
+                print("Successfully reconnected to SMTP server")
+                self.pool.emit("status", "✓ SMTP connection reestablished")
+                return True
+            except Exception as reconnect_error:
+                print(f"Failed to reconnect to SMTP server: {str(reconnect_error)}")
+                self.pool.emit("error", f"Failed to reconnect to SMTP server: {str(reconnect_error)}")
+                self.server = None
+                return False
+
+    def close(self):
+        if self.server:
+            try:
+                self.server.quit()
+                print(f"SMTP connection closed for {self.username}")
+                self.pool.emit("status", "✓ SMTP connection closed")
+            except Exception as e:
+                print(f"Error closing SMTP connection: {str(e)}")
+            self.server = None
+
+class SmtpPool:
+    """
+    Spreads a campaign over several SMTP accounts. Every account runs its own
+    sender thread with a persistent session and rate scheduler, and they all
+    pull from one bounded queue of ready messages so faster mailboxes take
+    more of the load. Progress goes to `events` as (event, record) pairs.
+    While the run is paused, senders and the dispatcher take no new work;
+    the sessions stay open and are reopened on resume if they were dropped.
+    """
+
+    def __init__(self, smtp_configs, use_cc=False, clock=time.monotonic, rediscover=None, on_sent=None):
+        self.smtp_configs = smtp_configs
+        self.use_cc = use_cc
+        self.rediscover = rediscover  # Re-probes an account whose cached method failed
+        self.on_sent = on_sent  # Called with (job, account) after each successful send
+        self.clock = clock
+        self.jobs = queue.Queue(maxsize=QUEUE_SLOTS_PER_ACCOUNT * max(len(smtp_configs), 1))
+        self.retries = queue.Queue()  # Throttled messages, sent before new ones
+        self.events = queue.Queue()
+        self.stop = threading.Event()  # Abort: senders drop what is queued
+        self.running = threading.Event()  # Cleared while the run is paused
+        self.running.set()
+        self.done = threading.Event()  # No more jobs: senders drain the queue
+        self.aborted = None  # Why dispatching stopped before the end of the sheet, if it did
+        self.senders = []
+
+    def emit(self, event_type, message, record=None):
+        self.events.put(({"type": event_type, "message": message}, record))
+
+    def record_sent(self, job, account):
+        if self.on_sent is None:
+            return
+        try:
+            self.on_sent(job, account)
+        except Exception as e:
+            # The email is already out, don't treat it as a failed send
+            print(f"Error recording email sent to {job['email']}: {str(e)}")
+
+    def connect(self):
+        """Open a session per account, yielding a status event for each."""
+        for smtp_config in self.smtp_configs:
+            sender = AccountSender(self, smtp_config)
+            try:
+                sender.connect()
+            except Exception as e:
+                print(f"SMTP connection error for {sender.username}: {str(e)}")
+                yield {"type": "status", "message": f"✕ SMTP connection failed for {sender.username}: {str(e)}"}
+                continue
+            self.senders.append(sender)
+            if len(self.smtp_configs) > 1:
+                yield {"type": "status", "message": f"✓ SMTP connection established for {sender.username}"}
+
+        if not self.senders:
+            raise ValueError("Could not connect to any SMTP account")
+        yield {"type": "status", "message": "✓ SMTP connection established"}
+
+        for sender in self.senders:
+            sender.start()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    def wait_running(self):
+        """Block while the run is paused. Returns False once it is stopped."""
+        self.running.wait()
+        return not self.stop.is_set()
+
+    def is_active(self):
+        return any(sender.is_alive() for sender in self.senders)
+
+    def quota_exhausted(self):
+        """Whether every account stopped because it used up today's quota."""
+        return bool(self.senders) and not any(sender.has_quota() for sender in self.senders)
+
+    def next_job(self, timeout=0.5):
+        try:
+            return self.retries.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self.jobs.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def retry(self, job):
+        self.retries.put(job)
+
+    def is_drained(self):
+        return self.jobs.empty() and self.retries.empty()
+
+    def submit(self, job):
+        """Queue a message for the next free account. Returns False if no account can take it."""
+        while not self.stop.is_set():
+            if not self.is_active():
+                return False
+            try:
+                self.jobs.put(job, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def finish(self, error=None):
+        """
+        Let the senders exit once the queue is drained. `error` records that
+        dispatching was cut short, so the run can't be reported as complete.
+        """
+        if error is not None:
+            self.aborted = error
+        self.done.set()
+
+    def shutdown(self, timeout=10):
+        self.stop.set()
+        self.running.set()  # Wake paused threads so they see the stop
+        for sender in self.senders:
+            sender.join(timeout=timeout)
+
+    def stats(self):
+        return [sender.stats() for sender in self.senders]
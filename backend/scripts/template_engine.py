@@ -0,0 +1,97 @@
+import re
+import threading
+
+# Placeholders are written as [NAME] in the template content
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-ZÀ-Ý0-9_]+)\]")
+KNOWN_PLACEHOLDERS = {"CIVILITÉ", "CIVILITY", "LAST_NAME", "COMPANY", "SCHOOL"}
+TEMPLATE_CACHE_MAX_ENTRIES = 256
+
+class CompiledTemplate:
+    """
+    A template parsed once into literal segments and the placeholders
+    between them. Unknown placeholders are kept as literal text and listed
+    in `unknown` so they can be reported.
+    """
+
+    def __init__(self, content, known=KNOWN_PLACEHOLDERS):
+        self.content = content
+        self.names = []  # Placeholder between each pair of segments
+        self.positions = []  # Offset of each placeholder in the content
+        self.unknown = []
+        self.segments = []
+        last = 0
+        for match in PLACEHOLDER_PATTERN.finditer(content):
+            name = match.group(1)
+            if name not in known:
+                if name not in self.unknown:
+                    self.unknown.append(name)
+                continue
+            self.segments.append(content[last:match.start()])
+            self.names.append(name)
+            self.positions.append(match.start())
+            last = match.end()
+        self.segments.append(content[last:])
+
+    def render(self, placeholders):
+        """Render with `placeholders`, a dict of string values keyed by upper-case name."""
+        parts = [None] * (2 * len(self.names) + 1)
+        parts[0::2] = self.segments
+        parts[1::2] = [placeholders[name] for name in self.names]
+        return "".join(parts)
+
+    def render_many(self, rows):
+        """Render one body per placeholder dict in `rows`."""
+        segments = self.segments
+        names = self.names
+        parts = [None] * (2 * len(names) + 1)
+        parts[0::2] = segments
+        bodies = []
+        for placeholders in rows:
+            parts[1::2] = [placeholders[name] for name in names]
+            bodies.append("".join(parts))
+        return bodies
+
+class TemplateCache:
+    """
+    Compiled templates keyed by (user, template id, updated_at), so a
+    template is only parsed again after it was edited.
+    """
+
+    def __init__(self, max_entries=TEMPLATE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, email, template_id, updated_at, load):
+        """Return the compiled template, calling `load()` for its content on a miss."""
+        key = (email, template_id, updated_at)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        compiled = CompiledTemplate(load())
+        with self._lock:
+            # Older versions of the same template are never used again
+            for stale in [k for k in self._entries if k[:2] == key[:2]]:
+                del self._entries[stale]
+            if len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = compiled
+        return compiled
+
+    def invalidate(self, email=None):
+        """Drop the compiled templates of one user, or of everyone."""
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == email]:
+                    del self._entries[key]
+
+# Shared by the campaign runs and the template endpoints of the process
+template_cache = TemplateCache()
@@ -0,0 +1,80 @@
+import io
+import os
+import hashlib
+from db.config_db import find_upload_hash, save_upload_hash
+
+# Pillow is only needed for perceptual hashing, which is off by default
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# === DEDUPLICATION SETTINGS ===
+UPLOAD_HASH_MAX_ENTRIES = int(os.getenv("UPLOAD_HASH_MAX_ENTRIES", 10000))  # Hashes kept per user
+UPLOAD_HASH_MAX_AGE_DAYS = int(os.getenv("UPLOAD_HASH_MAX_AGE_DAYS", 90))  # Unused hashes are evicted after this
+# Also match near-identical captures (re-taken screenshot of the same profile)
+PERCEPTUAL_DEDUP = os.getenv("UPLOAD_PERCEPTUAL_DEDUP", "false").lower() in ("1", "true", "yes")
+PERCEPTUAL_MAX_DISTANCE = int(os.getenv("UPLOAD_PERCEPTUAL_MAX_DISTANCE", 4))  # Differing bits out of 64
+PERCEPTUAL_HASH_SIZE = 8
+
+if PERCEPTUAL_DEDUP and Image is None:
+    print("⚠️ UPLOAD_PERCEPTUAL_DEDUP is set but Pillow is not installed, only exact duplicates are skipped")
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def perceptual_hash(data):
+    """
+    64-bit difference hash of an image as a signed integer (to fit a
+    BIGINT), or None when perceptual deduplication is off or the image
+    can't be read. Each bit tells whether a pixel of the 9x8 grayscale
+    thumbnail is brighter than its right neighbour.
+    """
+    if not PERCEPTUAL_DEDUP or Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            thumbnail = image.convert("L").resize((PERCEPTUAL_HASH_SIZE + 1, PERCEPTUAL_HASH_SIZE), Image.LANCZOS)
+            pixels = list(thumbnail.getdata())
+    except Exception as e:
+        print(f"⚠️ Could not compute perceptual hash: {e}")
+        return None
+
+    value = 0
+    width = PERCEPTUAL_HASH_SIZE + 1
+    for row in range(PERCEPTUAL_HASH_SIZE):
+        for column in range(PERCEPTUAL_HASH_SIZE):
+            left = pixels[row * width + column]
+            right = pixels[row * width + column + 1]
+            value = (value << 1) | (left > right)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class UploadFingerprint:
+    """Hashes of one screenshot, to look it up before uploading and remember it after."""
+
+    def __init__(self, owner, data, file_name):
+        self.owner = owner
+        self.file_name = file_name
+        self.content_hash = content_hash(data)
+        self.perceptual_hash = perceptual_hash(data)
+
+    def find_duplicate(self):
+        """
+        The earlier upload of the same screenshot for this user, if any. An
+        unreachable index doesn't block the upload, it is sent as usual.
+        """
+        try:
+            return find_upload_hash(self.owner, self.content_hash, self.perceptual_hash, PERCEPTUAL_MAX_DISTANCE)
+        except Exception as e:
+            print(f"⚠️ Could not check for a duplicate of {self.file_name}: {e}")
+            return None
+
+    def remember(self):
+        """Record the screenshot once the processing API has accepted it."""
+        try:
+            save_upload_hash(
+                self.owner, self.content_hash, self.perceptual_hash, self.file_name,
+                UPLOAD_HASH_MAX_ENTRIES, UPLOAD_HASH_MAX_AGE_DAYS
+            )
+        except Exception as e:
+            print(f"⚠️ Could not record the upload of {self.file_name}: {e}")
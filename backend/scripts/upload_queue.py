@@ -0,0 +1,316 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from scripts.upload_dedup import UploadFingerprint
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, ".."))
+
+# === UPLOAD QUEUE SETTINGS ===
+UPLOAD_QUEUE_PATH = os.getenv("UPLOAD_QUEUE_PATH", os.path.join(PROJECT_ROOT, "data", "upload_queue.db"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+UPLOAD_TIMEOUT = (5, float(os.getenv("UPLOAD_TIMEOUT", 60)))  # Connect and read timeouts in seconds
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", 8))
+UPLOAD_BACKOFF_BASE = 2  # Seconds before the first retry, doubled after each failure
+UPLOAD_BACKOFF_MAX = 600
+UPLOAD_HISTORY_SECONDS = 7 * 24 * 3600  # Finished uploads are forgotten after this long
+
+# Responses worth retrying; any other error status is a permanent failure
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+class PermanentUploadError(Exception):
+    """An upload that won't succeed by retrying it."""
+
+def backoff_delay(attempts, base=UPLOAD_BACKOFF_BASE, maximum=UPLOAD_BACKOFF_MAX):
+    """Seconds to wait after the `attempts`-th failure, with jitter so retries don't line up."""
+    delay = min(base * 2 ** (attempts - 1), maximum)
+    return delay * random.uniform(0.5, 1)
+
+class UploadQueue:
+    """
+    Screenshots waiting to be sent to the processing API, kept in a SQLite
+    file so a restart doesn't lose them. A pool of worker threads drains the
+    queue through one keep-alive session; failed uploads are retried with
+    exponential backoff up to `max_attempts`. `get_api_config(email)`
+    returns the user's (api_key, api_endpoint). `on_finish(upload, status,
+    error)` is called once an upload ends as done, duplicate or failed.
+    """
+
+    def __init__(self, get_api_config, path=UPLOAD_QUEUE_PATH, workers=UPLOAD_WORKERS,
+                 max_attempts=UPLOAD_MAX_ATTEMPTS, timeout=UPLOAD_TIMEOUT, on_finish=None):
+        self.get_api_config = get_api_config
+        self.on_finish = on_finish
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # Stays consistent on a crash with WAL, without an fsync per write
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(uploads)")}
+        for column in ("size", "mtime_ns"):
+            if column not in columns:
+                # Queue files created before the version of a file was kept with its upload
+                self._db.execute(f"ALTER TABLE uploads ADD COLUMN {column} INTEGER")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_uploads_due ON uploads (status, next_attempt_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_uploads_file ON uploads (owner, file_path)")
+        # Every file uploaded (or skipped as a duplicate), with its size and
+        # mtime then, so it isn't sent twice across restarts. Failed uploads
+        # stay out of it, so the next catch-up queues them again
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS processed_files (
+                owner TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                queued_at REAL NOT NULL,
+                PRIMARY KEY (owner, file_path)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_processed_files_folder ON processed_files (owner, folder)")
+        # Files used to be indexed when queued: forget those whose upload failed
+        self._db.execute("""
+            DELETE FROM processed_files WHERE EXISTS (
+                SELECT 1 FROM uploads f WHERE f.owner = processed_files.owner
+                AND f.file_path = processed_files.file_path AND f.status = 'failed'
+            ) AND NOT EXISTS (
+                SELECT 1 FROM uploads d WHERE d.owner = processed_files.owner
+                AND d.file_path = processed_files.file_path AND d.status IN ('done', 'duplicate')
+            )
+        """)
+        # Uploads cut short by a restart are sent again
+        self._db.execute("UPDATE uploads SET status = 'pending' WHERE status = 'uploading'")
+        self._db.execute(
+            "DELETE FROM uploads WHERE status IN ('done', 'duplicate', 'failed') AND updated_at < ?",
+            (time.time() - UPLOAD_HISTORY_SECONDS,)
+        )
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"upload-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let the workers finish their current upload and exit. Pending uploads stay queued."""
+        with self._cond:
+            self._stopping = True
+            threads, self._threads = self._threads, []
+            self._cond.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+
+    def enqueue(self, owner, folder, file_path, size, mtime_ns):
+        """
+        Queue a file for the user unless this version of it (same size and
+        mtime) was uploaded before, or it is already waiting to be uploaded.
+        Returns whether it was added.
+        """
+        now = time.time()
+        with self._cond:
+            indexed = self._db.execute("""
+                SELECT size, mtime_ns FROM processed_files WHERE owner = ? AND file_path = ?
+            """, (owner, file_path)).fetchone()
+            if indexed is not None and (indexed["size"], indexed["mtime_ns"]) == (size, mtime_ns):
+                return False
+            waiting = self._db.execute("""
+                SELECT 1 FROM uploads
+                WHERE owner = ? AND file_path = ? AND status IN ('pending', 'uploading')
+            """, (owner, file_path)).fetchone()
+            if waiting:
+                return False
+            self._db.execute("""
+                INSERT INTO uploads (owner, folder, file_path, size, mtime_ns, next_attempt_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (owner, folder, file_path, size, mtime_ns, now, now, now))
+            self._cond.notify()
+        return True
+
+    def processed_files(self, owner, folder):
+        """Files of the folder uploaded before for the user, as {path: (size, mtime_ns)}."""
+        with self._cond:
+            rows = self._db.execute("""
+                SELECT file_path, size, mtime_ns FROM processed_files WHERE owner = ? AND folder = ?
+            """, (owner, folder)).fetchall()
+        return {row["file_path"]: (row["size"], row["mtime_ns"]) for row in rows}
+
+    def stats(self, owner=None, folder=None):
+        """Number of uploads per status, for everyone or one user (and folder)."""
+        query = "SELECT status, COUNT(*) AS count FROM uploads WHERE 1 = 1"
+        params = []
+        if owner is not None:
+            query += " AND owner = ?"
+            params.append(owner)
+        if folder is not None:
+            query += " AND folder = ?"
+            params.append(folder)
+        with self._cond:
+            rows = self._db.execute(query + " GROUP BY status", params).fetchall()
+        counts = {"pending": 0, "uploading": 0, "done": 0, "duplicate": 0, "failed": 0}
+        counts.update({row["status"]: row["count"] for row in rows})
+        return counts
+
+    def last_error(self, owner, folder):
+        with self._cond:
+            row = self._db.execute("""
+                SELECT last_error FROM uploads
+                WHERE owner = ? AND folder = ? AND status NOT IN ('done', 'duplicate') AND last_error IS NOT NULL
+                ORDER BY updated_at DESC LIMIT 1
+            """, (owner, folder)).fetchone()
+        return row["last_error"] if row else None
+
+    def _claim(self):
+        """
+        Mark the next due upload as in progress and return it, or the seconds
+        until one is due. The queue file may be shared with another process
+        (the server and a standalone watcher), so an upload is only claimed
+        if it is still pending when it is marked.
+        """
+        now = time.time()
+        while True:
+            row = self._db.execute("""
+                SELECT * FROM uploads WHERE status = 'pending'
+                ORDER BY next_attempt_at LIMIT 1
+            """).fetchone()
+            if row is None:
+                return None, None
+            if row["next_attempt_at"] > now:
+                return None, row["next_attempt_at"] - now
+            claimed = self._db.execute("""
+                UPDATE uploads SET status = 'uploading', updated_at = ? WHERE id = ? AND status = 'pending'
+            """, (now, row["id"])).rowcount
+            if claimed:
+                return dict(row), None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    upload, wait = self._claim()
+                    if upload is not None:
+                        break
+                    self._cond.wait(wait)
+
+            try:
+                self._finish(upload, self._upload(upload))
+            except PermanentUploadError as e:
+                print(f"❌ Failed to upload {os.path.basename(upload['file_path'])}: {e}")
+                self._finish(upload, "failed", str(e))
+            except Exception as e:
+                self._retry(upload, str(e))
+
+    def _upload(self, upload):
+        """Send the file, or skip it if the user already uploaded the same screenshot. Returns the final status."""
+        file_path = upload["file_path"]
+        if not os.path.exists(file_path):
+            raise PermanentUploadError(f"File not found: {file_path}")
+        try:
+            api_key, api_endpoint = self.get_api_config(upload["owner"])
+        except ValueError as e:
+            raise PermanentUploadError(str(e))
+
+        file_name = os.path.basename(file_path)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        fingerprint = UploadFingerprint(upload["owner"], data, file_name)
+        duplicate = fingerprint.find_duplicate()
+        if duplicate is not None:
+            print(f"↷ Skipped {file_name}, same screenshot as {duplicate['file_name']}")
+            return "duplicate"
+
+        response = self.session.post(
+            api_endpoint,
+            headers={"Api-Key": api_key},
+            files={"file": (file_name, data, "image/png")},
+            timeout=self.timeout
+        )
+        if response.status_code in RETRY_STATUSES:
+            raise Exception(f"{response.status_code} - {response.text[:200]}")
+        if response.status_code >= 400:
+            raise PermanentUploadError(f"{response.status_code} - {response.text[:200]}")
+        fingerprint.remember()
+        print(f"✓ Uploaded: {file_name}")
+        return "done"
+
+    def _retry(self, upload, error):
+        attempts = upload["attempts"] + 1
+        file_name = os.path.basename(upload["file_path"])
+        if attempts >= self.max_attempts:
+            print(f"❌ Giving up on {file_name} after {attempts} attempts: {error}")
+            self._finish(upload, "failed", error, attempts)
+            return
+        delay = backoff_delay(attempts)
+        print(f"⚠️ Upload of {file_name} failed ({error}), retrying in {delay:.0f}s")
+        now = time.time()
+        with self._cond:
+            self._db.execute("""
+                UPDATE uploads SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ?
+                WHERE id = ?
+            """, (attempts, now + delay, error, now, upload["id"]))
+            self._cond.notify()
+
+    def _finish(self, upload, status, error=None, attempts=None):
+        now = time.time()
+        with self._cond:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("""
+                    UPDATE uploads SET status = ?, attempts = ?, last_error = COALESCE(?, last_error), updated_at = ?
+                    WHERE id = ?
+                """, (status, attempts or upload["attempts"] + 1, error, now, upload["id"]))
+                if status in ("done", "duplicate") and upload["size"] is not None:
+                    self._db.execute("""
+                        INSERT INTO processed_files (owner, folder, file_path, size, mtime_ns, queued_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (owner, file_path) DO UPDATE SET
+                        size = excluded.size, mtime_ns = excluded.mtime_ns, queued_at = excluded.queued_at
+                    """, (upload["owner"], upload["folder"], upload["file_path"], upload["size"], upload["mtime_ns"], now))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if self.on_finish is None:
+            return
+        try:
+            self.on_finish(upload, status, error)
+        except Exception as e:
+            # The upload itself is settled, only the feedback is lost
+            print(f"Error reporting upload of {os.path.basename(upload['file_path'])}: {str(e)}")
@@ -1,15 +1,12 @@
 import os
 import sys
 import time
-import requests
+import threading
 from datetime import datetime
 from subprocess import run
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import subprocess
-import json
 from dotenv import load_dotenv
-import shutil
 
 # Add the parent directory to Python path
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -22,21 +19,21 @@ load_dotenv(os.path.join(PROJECT_ROOT, ".env"))
 
 # Import after path setup
 from db.config_db import get_user_config
+from scripts.upload_queue import UploadQueue
 
 # === CONFIGURATION ===
 # Get watch folder from command line argument or use default
 WATCH_FOLDER = sys.argv[1] if len(sys.argv) > 1 else "/Users/victorsoto/Downloads"
 
 SUPPORTED_EXTENSIONS = [".png"]
-POLL_INTERVAL_SECONDS = 5
+STABILITY_CHECK_INTERVAL = 0.5  # Seconds between size/mtime checks of a new file
+STABILITY_SETTLE_SECONDS = float(os.getenv("WATCH_SETTLE_SECONDS", 1))  # Quiet time before a file counts as written
+CATCH_UP_MAX_AGE_SECONDS = int(os.getenv("WATCH_CATCH_UP_MAX_AGE", 7 * 24 * 3600))  # Older files are left alone at startup
 
 LOG_DIR = os.path.join(PROJECT_ROOT, "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = os.path.join(LOG_DIR, "upload_logs.txt")
 
-# Track processed files to avoid duplicates
-processed_files = set()
-
 def get_api_config(email):
     """Get API configuration from user's settings."""
     config = get_user_config(email)
@@ -65,95 +62,150 @@ def log_event(status, filename, detail=""):
     with open(LOG_FILE, "a") as f:
         f.write(f"[{timestamp}] {status.upper()}: {filename} {detail}\n")
 
-def upload_file(file_path, api_key, api_endpoint):
-    try:
-        with open(file_path, "rb") as f:
-            files = {"file": f}
-            headers = {"Api-Key": api_key}
-            response = requests.post(api_endpoint, headers=headers, files=files)
-
-        filename = os.path.basename(file_path)
-        profile_name = filename.split(" - Screenshot")[0] if " - Screenshot" in filename else filename
-
-        if response.status_code == 200:
-            print(f"✓ Uploaded: {filename}")
-            log_event("uploaded", filename)
-            notify("Profile Processed", f"Profile of {profile_name} well processed")
-        else:
-            msg = f"{response.status_code} - {response.text}"
-            print(f"❌ Failed to upload {filename}: {msg}")
-            log_event("failed", filename, msg)
-            notify("Processing Failed", f"Failed to process profile of {profile_name}")
-
-    except Exception as e:
-        print(f"⚠️ Error uploading {file_path}: {e}")
-        log_event("error", file_path, str(e))
-        notify("Upload Error", os.path.basename(file_path))
+def report_upload(upload, status, error=None):
+    """Log how a queued upload ended and notify the user."""
+    filename = os.path.basename(upload["file_path"])
+    profile_name = filename.split(" - Screenshot")[0] if " - Screenshot" in filename else filename
+    if status == "done":
+        log_event("uploaded", filename)
+        notify("Profile Processed", f"Profile of {profile_name} well processed")
+    elif status == "duplicate":
+        log_event("duplicate", filename)
+        notify("Profile Skipped", f"Profile of {profile_name} was already processed")
+    else:
+        log_event("failed", filename, error or "")
+        notify("Processing Failed", f"Failed to process profile of {profile_name}")
+
+def is_screenshot(file_path):
+    """Supported images, leaving out hidden files such as the temp files macOS writes screenshots to."""
+    file_name = os.path.basename(file_path)
+    return not file_name.startswith('.') and os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS
+
+class StabilityMonitor:
+    """
+    Waits until files are completely written before handing them on: a file
+    is ready once its size and mtime are the same on two checks in a row and
+    it hasn't been modified for `settle` seconds. Files that disappear while
+    waiting (temp files renamed away) are dropped. One thread checks the
+    files of every watched folder.
+    """
+
+    def __init__(self, interval=STABILITY_CHECK_INTERVAL, settle=STABILITY_SETTLE_SECONDS):
+        self.interval = interval
+        self.settle = settle
+        self._pending = {}  # (path, on_ready) -> (size, mtime_ns) at the last check
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="file-stability", daemon=True)
+        self._thread.start()
+
+    def add(self, file_path, on_ready):
+        """Call `on_ready(file_path, size, mtime_ns)` once the file is stable."""
+        with self._lock:
+            self._pending.setdefault((file_path, on_ready), None)
+
+    def discard(self, on_ready):
+        """Stop waiting for the files added with `on_ready`."""
+        with self._lock:
+            for key in [key for key in self._pending if key[1] == on_ready]:
+                del self._pending[key]
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self):
+        with self._lock:
+            pending = list(self._pending.items())
+        now = time.time()
+        for key, last in pending:
+            file_path, on_ready = key
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                with self._lock:
+                    self._pending.pop(key, None)
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != last or stat.st_size == 0 or now - stat.st_mtime < self.settle:
+                with self._lock:
+                    if key in self._pending:
+                        self._pending[key] = current
+                continue
+            with self._lock:
+                if key not in self._pending:
+                    continue  # Discarded meanwhile
+                del self._pending[key]
+            try:
+                on_ready(file_path, *current)
+            except Exception as e:
+                print(f"Error processing {os.path.basename(file_path)}: {e}")
 
 class ImageHandler(FileSystemEventHandler):
-    def __init__(self, folder_path, email):
+    def __init__(self, folder_path, email, upload_queue, monitor):
         self.folder_path = folder_path
         self.email = email
-        self.processed_files = set()  # Keep track of processed files
-        self.last_processed_time = {}  # Keep track of last processed time for each file
-        self.api_key, self.api_endpoint = get_api_config(email)
+        self.upload_queue = upload_queue  # Uploads run on the queue's workers, off the observer thread
+        self.monitor = monitor  # Holds files back until they are fully written
+        get_api_config(email)  # Fail early when the user has no processing API settings
 
     def on_created(self, event):
-        if event.is_directory:
-            return
+        self.track(event.src_path, event.is_directory)
 
-        if not event.src_path.lower().endswith('.png'):
-            return
-
-        # Get file name and current time
-        file_name = os.path.basename(event.src_path)
-        # Remove any leading dots from the filename
-        file_name = file_name.lstrip('.')
-        current_time = time.time()
+    def on_modified(self, event):
+        self.track(event.src_path, event.is_directory)
 
-        # Check if we've processed this file recently (within last 5 seconds)
-        if file_name in self.last_processed_time:
-            if current_time - self.last_processed_time[file_name] < 5:
-                return
+    def on_moved(self, event):
+        # Screenshots are written to a hidden temp file, then renamed
+        self.track(event.dest_path, event.is_directory)
 
-        # Check if we've already processed this file
-        if file_name in self.processed_files:
+    def track(self, file_path, is_directory=False):
+        if is_directory or os.path.dirname(file_path) != self.folder_path or not is_screenshot(file_path):
             return
-
-        try:
-            # Process the file
-            file_path = os.path.join(self.folder_path, file_name)
-            if not os.path.exists(file_path):
-                print(f"File not found: {file_path}")
-                return
-
-            with open(file_path, 'rb') as f:
-                files = {'file': (file_name, f, 'image/png')}
-                headers = {"Api-Key": self.api_key}
-                response = requests.post(
-                    self.api_endpoint,
-                    headers=headers,
-                    files=files
-                )
-                response.raise_for_status()
-                print(f"✓ Uploaded: {file_name}")
-                
-                # Mark file as processed and update last processed time
-                self.processed_files.add(file_name)
-                self.last_processed_time[file_name] = current_time
-
-        except Exception as e:
-            print(f"Error processing {file_name}: {e}")
+        self.monitor.add(file_path, self.enqueue)
+
+    def enqueue(self, file_path, size, mtime_ns):
+        if self.upload_queue.enqueue(self.email, self.folder_path, file_path, size, mtime_ns):
+            print(f"→ Queued: {os.path.basename(file_path)}")
+
+    def catch_up(self, max_age=CATCH_UP_MAX_AGE_SECONDS):
+        """
+        Queue the screenshots added while the folder wasn't watched: files
+        modified in the last `max_age` seconds that aren't in the processed
+        index, or changed since. Returns how many were found.
+        """
+        processed = self.upload_queue.processed_files(self.email, self.folder_path)
+        cutoff = time.time() - max_age
+        found = 0
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_screenshot(entry.path):
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime < cutoff or processed.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                self.monitor.add(entry.path, self.enqueue)
+                found += 1
+        return found
 
 def watch_folder(folder_path, email):
     try:
         # Verify API configuration before starting
         get_api_config(email)
         
-        event_handler = ImageHandler(folder_path, email)
+        folder_path = os.path.realpath(folder_path)
+        upload_queue = UploadQueue(get_api_config, on_finish=report_upload)
+        upload_queue.start()
+        monitor = StabilityMonitor()
+        event_handler = ImageHandler(folder_path, email, upload_queue, monitor)
         observer = Observer()
         observer.schedule(event_handler, folder_path, recursive=False)
         observer.start()
+        print(f"Catching up on {event_handler.catch_up()} screenshots added while not watching")
 
         try:
             while True:
@@ -161,6 +213,8 @@ def watch_folder(folder_path, email):
         except KeyboardInterrupt:
             observer.stop()
         observer.join()
+        monitor.stop()
+        upload_queue.stop()
     except ValueError as e:
         print(f"Error: {e}")
         sys.exit(1)
@@ -0,0 +1,31 @@
+import io
+import pandas as pd
+from scripts.contacts import prepare_contact_frame, render_contact
+from scripts.template_engine import CompiledTemplate
+
+ENRICHED = {"language": "English", "civility": "Ms", "hq": "", "ftes": "", "description": ""}
+
+def read_contacts(csv):
+    df = pd.read_csv(io.StringIO(csv))
+    return prepare_contact_frame(df, set(), "January 01, 2025")
+
+def test_blank_last_name_renders_empty():
+    rows = read_contacts(
+        "first_name,last_name,email,company,role,education,location\n"
+        "Claire,,claire@example.com,Acme,CTO,,London\n"
+    )
+    template = CompiledTemplate("Dear [CIVILITY] [LAST_NAME], at [COMPANY]")
+
+    rendered = render_contact(rows[0], ENRICHED, template, template)
+
+    assert rendered["body"] == "Dear Ms , at Acme"
+    assert "nan" not in rendered["body"]
+
+def test_blank_company_renders_empty():
+    rows = read_contacts(
+        "first_name,last_name,email,company,role,education,location\n"
+        "Claire,Martin,claire@example.com,,CTO,,London\n"
+    )
+    template = CompiledTemplate("[LAST_NAME] at [COMPANY].")
+
+    assert render_contact(rows[0], ENRICHED, template, template)["body"] == "Martin at ."
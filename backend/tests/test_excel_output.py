@@ -0,0 +1,21 @@
+import pandas as pd
+from scripts.excel_output import cell_value, write_xlsx
+
+def test_missing_values_are_blank():
+    for value in (None, float("nan"), pd.NaT, pd.NA):
+        assert cell_value(value) is None
+    assert cell_value("Acme") == "Acme"
+
+def test_write_xlsx_with_missing_dates_and_numbers(tmp_path):
+    df = pd.DataFrame({
+        "email": ["claire@example.com", "luc@example.com"],
+        "sent_at": [pd.NaT, pd.Timestamp("2025-01-01")],
+        "ftes": pd.array([pd.NA, 600], dtype="Int64")
+    })
+    path = tmp_path / "contacts.xlsx"
+
+    assert write_xlsx(str(path), ["email", "sent_at", "ftes"], [df]) == 2
+
+    written = pd.read_excel(path)
+    assert written["sent_at"].isna()[0]
+    assert written["ftes"].isna()[0]
@@ -0,0 +1,30 @@
+from scripts.sheet_fetch import SheetCache, SheetDownload, read_csv_head
+
+def test_read_csv_head_stops_after_the_requested_rows():
+    consumed = []
+
+    def lines():
+        yield "email,notes\n"
+        for i in range(1000):
+            consumed.append(i)
+            yield f'u{i}@example.com,"first line\n'
+            yield 'second ""quoted"" line"\n'
+
+    head = read_csv_head(lines(), 2)
+
+    assert head == (
+        "email,notes\n"
+        'u0@example.com,"first line\nsecond ""quoted"" line"\n'
+        'u1@example.com,"first line\nsecond ""quoted"" line"\n'
+    )
+    assert len(consumed) == 2
+
+def test_peek_only_returns_fresh_entries():
+    now = [0]
+    cache = SheetCache(ttl=30, session=object(), clock=lambda: now[0])
+    cache._store(SheetDownload("sheet", content=b"email\n", checked_at=0))
+
+    assert cache.peek("sheet").content == b"email\n"
+    assert cache.peek("other") is None
+    now[0] = 31
+    assert cache.peek("sheet") is None
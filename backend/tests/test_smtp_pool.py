@@ -0,0 +1,72 @@
+import pytest
+from scripts.smtp_pool import AccountSender, SendRateScheduler, SmtpPool, RATE_INCREASE_STEP
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+def test_reserve_spends_the_burst_then_waits_for_a_refill():
+    clock = FakeClock()
+    scheduler = SendRateScheduler(0.5, burst=2, clock=clock)
+
+    assert scheduler.reserve() == 0
+    assert scheduler.reserve() == 0
+    assert scheduler.reserve() == pytest.approx(2.0)
+
+    clock.advance(1)
+    assert scheduler.reserve() == pytest.approx(1.0)
+    clock.advance(1)
+    assert scheduler.reserve() == 0
+
+def test_refund_returns_an_unused_token():
+    clock = FakeClock()
+    scheduler = SendRateScheduler(0.5, burst=1, clock=clock)
+
+    assert scheduler.reserve() == 0
+    scheduler.refund()
+    assert scheduler.reserve() == 0
+    assert scheduler.reserve() > 0
+
+def test_throttling_halves_the_rate_down_to_the_minimum():
+    clock = FakeClock()
+    scheduler = SendRateScheduler(0.5, burst=2, min_rate=0.1, clock=clock)
+
+    scheduler.on_throttle()
+    assert scheduler.rate == pytest.approx(0.25)
+    assert scheduler.reserve() == pytest.approx(4.0)  # The bucket is emptied
+
+    for _ in range(10):
+        scheduler.on_throttle()
+    assert scheduler.rate == pytest.approx(0.1)
+
+def test_successes_recover_the_configured_rate():
+    clock = FakeClock()
+    scheduler = SendRateScheduler(0.5, min_rate=0.1, clock=clock)
+    for _ in range(10):
+        scheduler.on_throttle()
+
+    scheduler.on_success()
+    assert scheduler.rate == pytest.approx(0.1 + 0.5 * RATE_INCREASE_STEP)
+
+    for _ in range(100):
+        scheduler.on_success()
+    assert scheduler.rate == pytest.approx(0.5)
+
+def test_accounts_stop_at_their_daily_limit():
+    pool = SmtpPool([], clock=FakeClock())
+    sender = AccountSender(pool, {"username": "sales@example.com", "password": "", "daily_limit": 2})
+    pool.senders.append(sender)
+
+    sender.sent_today = 1
+    assert sender.has_quota()
+    assert not pool.quota_exhausted()
+
+    sender.sent_today = 2
+    assert not sender.has_quota()
+    assert pool.quota_exhausted()
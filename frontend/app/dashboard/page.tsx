@@ -11,6 +11,7 @@ import { FolderOpen } from "lucide-react";
 import { Switch } from "@/components/ui/switch";
 import { ArrowDownTrayIcon, PaperAirplaneIcon } from "@heroicons/react/24/outline";
 import ContactPreviewDialog from "@/components/ContactPreviewDialog";
+import { followJobEvents, startCampaignJob } from "@/lib/campaign-jobs";
 import { useDropzone } from "react-dropzone";
 
 interface Session {
@@ -150,55 +151,18 @@ export default function DashboardPage() {
 
   const streamEmailSending = async () => {
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/send-emails`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          email: session?.user?.email,
-          sheet_url: config?.google_sheet_url,
-          confirmed: true,
-        }),
+      const jobId = await startCampaignJob({
+        email: session?.user?.email,
+        sheet_url: config?.google_sheet_url,
       });
 
-      if (!response.ok) throw new Error("Failed to send emails");
-
-      const reader = response.body?.getReader();
-      const decoder = new TextDecoder();
-      if (!reader) throw new Error("No response stream");
-
-      while (true) {
-        const { value, done } = await reader.read();
-        if (done) break;
-
-        const chunk = decoder.decode(value);
-        const lines = chunk.split("\n").filter(Boolean);
-
-        for (const line of lines) {
-          try {
-            const cleanLine = line.replace(/^data: /, "").trim();
-            if (!cleanLine) continue;
-            
-            // Handle both JSON and plain text messages
-            let message;
-            try {
-              const parsed = JSON.parse(cleanLine);
-              message = parsed.message;
-            } catch {
-              // If not JSON, use the line as is
-              message = cleanLine;
-            }
-
-            if (message) {
-              setEmailStatus(prev => [...prev, message]);
-              if (message.includes("✓ Email sent to")) {
-                setEmailsSent(prev => prev + 1);
-              }
-            }
-          } catch (e) {
-            console.warn("Stream parse error:", line);
-          }
+      await followJobEvents(jobId, ({ message }) => {
+        if (!message) return;
+        setEmailStatus(prev => [...prev, message]);
+        if (message.includes("✓ Email sent to")) {
+          setEmailsSent(prev => prev + 1);
         }
-      }
+      });
     } catch (err) {
       toast.error("Streaming error during email send");
     }
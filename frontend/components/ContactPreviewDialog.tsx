@@ -3,6 +3,7 @@ import { Button } from "@/components/ui/button";
 import { toast } from "sonner";
 import { Checkbox } from "@/components/ui/checkbox";
 import { Label } from "@/components/ui/label";
+import { followJobEvents, startCampaignJob } from "@/lib/campaign-jobs";
 
 interface ContactPreviewDialogProps {
   data: any[];
@@ -62,91 +63,51 @@ const ContactPreviewDialog: React.FC<ContactPreviewDialogProps> = ({
     setIsComplete(false);
 
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/send-emails`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          email,
-          sheet_url: sheetUrl,
-          confirmed: true,
-          use_cc: useCc,
-        }),
+      const jobId = await startCampaignJob({
+        email,
+        sheet_url: sheetUrl,
+        use_cc: useCc,
       });
 
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.detail || "Failed to send emails");
-      }
-
-      const reader = response.body?.getReader();
-      const decoder = new TextDecoder();
-      if (!reader) throw new Error("No response stream");
-
-      while (true) {
-        const { value, done } = await reader.read();
-        if (done) break;
-
-        const chunk = decoder.decode(value);
-        const lines = chunk.split("\n").filter(Boolean);
-
-        for (const line of lines) {
-          try {
-            const cleanLine = line.replace(/^data: /, "").trim();
-            if (!cleanLine) continue;
-            
-            let message;
-            let type = "status";
-            try {
-              const parsed = JSON.parse(cleanLine);
-              message = parsed.message;
-              type = parsed.type || "status";
-            } catch {
-              message = cleanLine;
-            }
-
-            if (message) {
-              console.log(`[${type}] ${message}`);
-              
-              if (type === "error") {
-                console.log("Error detected, closing dialogs");
-                toast.error(message);
-                setIsSending(false);
-                setShowStreamingDialog(false);
-                return;
-              } else if (message.includes("✓ Email sent to")) {
-                onEmailsSent(1);
-                toast.success(message);
-              } else if (message.includes("✓ All emails sent successfully")) {
-                console.log("All emails sent, preparing to close dialogs");
-                setIsComplete(true);
-                toast.success("✓ All emails sent successfully");
-                
-                // Force state updates in sequence
-                setIsSending(false);
-                console.log("isSending set to false");
-                
-                setShowStreamingDialog(false);
-                console.log("showStreamingDialog set to false");
-                
-                // Small delay to ensure state updates are processed
-                setTimeout(() => {
-                  console.log("Closing main dialog");
-                  onClose();
-                }, 100);
-              } else {
-                // Just log other messages without showing toasts
-                console.log(`[${type}] ${message}`);
-              }
-            }
-          } catch (e) {
-            console.error("Stream parse error:", e, line);
-            toast.error("Error processing server response");
-            setIsSending(false);
-            setShowStreamingDialog(false);
-            return;
-          }
+      await followJobEvents(jobId, ({ type = "status", message, campaign_status }) => {
+        if (!message) return;
+        console.log(`[${type}] ${message}`);
+
+        if (type === "error") {
+          console.log("Error detected, closing dialogs");
+          toast.error(message);
+          setIsSending(false);
+          setShowStreamingDialog(false);
+          return false;
+        } else if (campaign_status === "paused" || campaign_status === "incomplete") {
+          // Not everything went out, the campaign can be resumed later
+          toast.warning(message);
+          setIsSending(false);
+          setShowStreamingDialog(false);
+          onClose();
+          return false;
+        } else if (message.includes("✓ Email sent to")) {
+          onEmailsSent(1);
+          toast.success(message);
+        } else if (message.includes("✓ All emails sent successfully")) {
+          console.log("All emails sent, preparing to close dialogs");
+          setIsComplete(true);
+          toast.success("✓ All emails sent successfully");
+          
+          // Force state updates in sequence
+          setIsSending(false);
+          console.log("isSending set to false");
+          
+          setShowStreamingDialog(false);
+          console.log("showStreamingDialog set to false");
+          
+          // Small delay to ensure state updates are processed
+          setTimeout(() => {
+            console.log("Closing main dialog");
+            onClose();
+          }, 100);
         }
-      }
+      });
     } catch (error: any) {
       console.error("Error sending emails:", error);
       toast.error(error.message || "Failed to send emails");
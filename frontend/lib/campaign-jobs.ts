@@ -0,0 +1,87 @@
+// Campaigns run as background jobs on the backend: starting one returns a
+// job id, and progress is read from the job's event stream.
+
+export interface JobEvent {
+  seq: number;
+  type?: string;
+  message?: string;
+  [key: string]: any;
+}
+
+// "paused" and "incomplete" campaigns stopped early and can be resumed
+const FINISHED_STATUSES = ["completed", "paused", "incomplete", "failed", "cancelled"];
+const RECONNECT_DELAY_MS = 1000;
+
+export async function startCampaignJob(body: Record<string, any>): Promise<string> {
+  const response = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/send-emails`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ ...body, confirmed: true }),
+  });
+
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => null);
+    throw new Error(errorData?.detail?.message || errorData?.detail || "Failed to send emails");
+  }
+
+  const { job_id } = await response.json();
+  return job_id;
+}
+
+/**
+ * Follow a job's events until it finishes, reconnecting from the last
+ * event seen if the stream drops. Return false from `onEvent` to stop.
+ */
+export async function followJobEvents(
+  jobId: string,
+  onEvent: (event: JobEvent) => boolean | void,
+): Promise<void> {
+  let lastSeq = -1;
+
+  while (true) {
+    try {
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_BACKEND_URL}/jobs/${jobId}/events?after=${lastSeq}`,
+      );
+      if (response.status === 404) throw new Error("Campaign job not found");
+      if (!response.ok) throw new Error("Failed to read campaign progress");
+
+      const reader = response.body?.getReader();
+      if (!reader) throw new Error("No response stream");
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() || "";
+
+        for (const line of lines) {
+          const cleanLine = line.replace(/^data: /, "").trim();
+          if (!cleanLine) continue;
+          const event: JobEvent = JSON.parse(cleanLine);
+          lastSeq = event.seq;
+          if (onEvent(event) === false) {
+            await reader.cancel();
+            return;
+          }
+        }
+      }
+    } catch (error: any) {
+      if (error?.message === "Campaign job not found") throw error;
+      console.warn("Campaign progress stream interrupted, reconnecting:", error);
+    }
+
+    // The stream ends when the job finishes; otherwise it dropped, so resubscribe
+    const statusResponse = await fetch(`${process.env.NEXT_PUBLIC_BACKEND_URL}/jobs/${jobId}`).catch(() => null);
+    if (statusResponse?.status === 404) throw new Error("Campaign job not found");
+    if (statusResponse?.ok) {
+      const job = await statusResponse.json();
+      if (FINISHED_STATUSES.includes(job.status) && job.last_seq <= lastSeq) return;
+    }
+    await new Promise((resolve) => setTimeout(resolve, RECONNECT_DELAY_MS));
+  }
+}